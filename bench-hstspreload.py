@@ -0,0 +1,1042 @@
+"""Benchmarks for looking up hosts in the HSTS preload list"""
+
+import argparse
+import asyncio
+import compileall
+import contextlib
+import importlib.util
+import io
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import timeit
+import urllib.parse
+
+import hstspreload
+from hstspreload import _GTLD_INCLUDE_SUBDOMAINS
+from hstspreload._extras import _idna_encode, _Stats
+from hstspreload._list import (
+    _HAS_CHILDREN,
+    _INCLUDE_SUBDOMAINS,
+    _IS_LEAF,
+    _buffer_reader,
+    _iter_entries,
+    _LoadedList,
+    _read_index,
+    _scan_bucket,
+    open_pkg_binary,
+)
+
+
+def load_build_script():
+    path = os.path.join(
+        os.path.dirname(os.path.abspath(__file__)), "build-hstspreload.py"
+    )
+    spec = importlib.util.spec_from_file_location("build_hstspreload", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def load_entries():
+    """Returns the (name, include_subdomains) of every host in 'hstspreload.bin'"""
+    with open_pkg_binary("hstspreload.bin") as f:
+        data = f.read()
+    index = _read_index(_buffer_reader(data))
+    return [
+        (name, bool(flags & _INCLUDE_SUBDOMAINS))
+        for name, flags in index.iter_leaves(_buffer_reader(data))
+    ]
+
+
+def use_list(data):
+    """Makes the functions of the module look up hosts in the list encoded
+    in 'data'"""
+    fd, path = tempfile.mkstemp(suffix=".bin")
+    with os.fdopen(fd, "wb") as f:
+        f.write(data)
+    try:
+        hstspreload._set_default(hstspreload.HSTSPreloadList(path))
+    finally:
+        try:
+            os.remove(path)
+        except OSError:
+            # Windows can't remove a file while it's mapped.
+            pass
+
+
+def reset():
+    """Restores the bundled list with the default lookup mode and cache sizes"""
+    hstspreload._set_default(hstspreload.HSTSPreloadList())
+
+
+def uncached_lookup():
+    """Returns the lookup of the module's list that bypasses the host cache"""
+    return hstspreload._get_default()._loaded.lookup
+
+
+def load_fixtures(count, seed=0):
+    """Samples 'count' hosts from 'hstspreload.bin' for every way a lookup
+    can end, and a mix of all of them as str and bytes"""
+    entries = load_entries()
+    # Sub-domains of these still fit in the 5 layers a lookup visits.
+    exact = [name for name, include in entries if not include and name.count(b".") < 4]
+    include = [name for name, include in entries if include and name.count(b".") < 4]
+    gtlds = sorted(_GTLD_INCLUDE_SUBDOMAINS)
+    rand = random.Random(seed)
+
+    def sample(names, template, expected):
+        # Drop hosts that resolve differently, e.g. a sub-domain of an
+        # exact match that is preloaded by one of its parents.
+        hosts = [template % rand.choice(names) for _ in range(2 * count)]
+        results = hstspreload.in_hsts_preload_many(hosts)
+        return [host for host, result in zip(hosts, results) if result is expected][
+            :count
+        ]
+
+    fixtures = {
+        "exact hits": sample(exact, b"%s", True),
+        "include-subdomains hits": sample(include, b"www.%s", True),
+        # Every layer continues into the next one until the last.
+        "deep misses": sample(exact, b"www.%s", False),
+        # The first layer already has no matching entry.
+        "shallow misses": sample(
+            [b"%d" % rand.randrange(1 << 30) for _ in range(count)],
+            b"www.%s.not-preloaded",
+            False,
+        ),
+        "gTLD hits": sample(gtlds, b"www.example.%s", True),
+    }
+    mixed = [host for hosts in fixtures.values() for host in hosts]
+    fixtures["mixed str/bytes"] = [
+        host.decode("ascii") if rand.random() < 0.5 else host
+        for host in rand.sample(mixed, min(count, len(mixed)))
+    ]
+    return fixtures
+
+
+def load_hosts(count, seed=0):
+    """Samples a mix of preloaded hosts, sub-domains of preloaded
+    hosts and hosts that aren't on the list from 'hstspreload.bin'"""
+    names = [name for name, _ in load_entries()]
+
+    rand = random.Random(seed)
+    hosts = []
+    for _ in range(count):
+        name = rand.choice(names)
+        hosts.append(
+            rand.choice((name, b"www." + name, b"not-preloaded-" + name + b".test"))
+        )
+    return hosts
+
+
+def legacy_iter_entries(data):
+    """The bucket scanner before it walked buckets by offset"""
+    while data:
+        flags = data[0]
+        size = data[1]
+        label = bytes(data[2 : 2 + size])
+        yield (flags & _IS_LEAF, flags & _INCLUDE_SUBDOMAINS, label)
+        data = data[2 + size :]
+
+
+def measure(func, hosts, repeat=3):
+    """Returns the best time per call of 'func' in microseconds"""
+    timer = timeit.Timer(lambda: [func(host) for host in hosts])
+    return min(timer.repeat(repeat=repeat, number=1)) / len(hosts) * 1e6
+
+
+def bench_misses(args):
+    # Hosts that aren't preloaded but whose registrable domain or TLD
+    # often shares buckets with ones that are.
+    rand = random.Random(0)
+    domains = [host.split(b".", 1)[-1] for host in load_hosts(2000)]
+    hosts = [
+        b"not-preloaded-%d.%s" % (rand.randrange(1 << 30), rand.choice(domains))
+        for _ in range(args.hosts)
+    ]
+    hosts = [
+        host
+        for host, preloaded in zip(hosts, hstspreload.in_hsts_preload_many(hosts))
+        if not preloaded
+    ]
+    hstspreload.set_cache_sizes(bucket_bytes=0)
+    index = hstspreload._get_default()._loaded.load_index()
+    bloom = index.bloom
+    if bloom is None:
+        print("hstspreload.bin has no Bloom filter")
+        return {}
+    rejected = 100.0 * sum(not bloom.may_match(host) for host in hosts) / len(hosts)
+    print("Bloom filter rejects %.1f%% of %d misses" % (rejected, len(hosts)))
+    results = {"rejected_percent": rejected}
+
+    # Only lookups that would open the file check the filter.
+    lookup = uncached_lookup()
+    for name, func in (
+        ("one by one", lambda: [lookup(host) for host in hosts]),
+        ("batched", lambda: hstspreload.in_hsts_preload_many(hosts)),
+    ):
+        timings = []
+        for filtered in (None, bloom):
+            index.bloom = filtered
+            seconds = min(timeit.Timer(func).repeat(repeat=3, number=1))
+            timings.append(seconds / len(hosts) * 1e6)
+        print(
+            "%-10s %.2f us/lookup without the filter, %.2f us/lookup with it"
+            % (name + ":", timings[0], timings[1])
+        )
+        results[name] = {"without_filter_us": timings[0], "with_filter_us": timings[1]}
+    return results
+
+
+def bench_lookups(args):
+    results = {}
+    for name, hosts in load_fixtures(args.hosts).items():
+        # Cold lookups open the file with empty caches, only time a sample.
+        def cold(host):
+            hstspreload.cache_clear()
+            return hstspreload.in_hsts_preload(host)
+
+        cold_us = measure(cold, hosts[: max(1, len(hosts) // 10)], repeat=1)
+        hstspreload.set_cache_sizes(hosts=len(hosts))
+        warm_us = measure(hstspreload.in_hsts_preload, hosts)
+        hstspreload.cache_clear()
+        timer = timeit.Timer(lambda: hstspreload.in_hsts_preload_many(hosts))
+        batched_us = min(timer.repeat(repeat=3, number=1)) / len(hosts) * 1e6
+        hstspreload.set_cache_sizes(hosts=1024)
+
+        results[name] = {
+            "cold_us": cold_us,
+            "warm_us": warm_us,
+            "batched_us": batched_us,
+        }
+        print(
+            "%-24s %7.2f us cold, %5.2f us warm, %5.2f us/host batched"
+            % (name + ":", cold_us, warm_us, batched_us)
+        )
+    return results
+
+
+def write_json_fixture(path):
+    """Writes the hosts in 'hstspreload.bin' as the JSON the build downloads"""
+    entries = [
+        {
+            "name": name.decode("ascii"),
+            "policy": "custom",
+            "mode": "force-https",
+            "include_subdomains": include_subdomains,
+        }
+        for name, include_subdomains in load_entries()
+    ]
+    with open(path, "w") as f:
+        f.write("// Generated from hstspreload.bin\n")
+        json.dump({"entries": entries}, f, indent=2)
+
+
+def bench_async(args):
+    hosts = load_hosts(args.hosts)
+
+    async def source():
+        for host in hosts:
+            yield host
+
+    async def inline():
+        async for host in source():
+            hstspreload.in_hsts_preload(host)
+
+    async def classify():
+        async for _ in hstspreload.aclassify(source()):
+            pass
+
+    async def measure_loop(coroutine):
+        # The longest time the loop didn't get to run a ticking task.
+        started = last = time.perf_counter()
+        longest = 0.0
+        done = False
+
+        async def tick():
+            nonlocal last, longest
+            while not done:
+                now = time.perf_counter()
+                longest = max(longest, now - last)
+                last = now
+                await asyncio.sleep(0)
+
+        ticker = asyncio.ensure_future(tick())
+        await coroutine
+        seconds = time.perf_counter() - started
+        done = True
+        await ticker
+        longest = max(longest, time.perf_counter() - last)
+        return seconds / len(hosts) * 1e6, longest * 1e3
+
+    results = {}
+    for mode in ("per-call open", "load_all()"):
+        if mode == "load_all()":
+            hstspreload.load_all()
+        for name, coroutine in (("inline", inline), ("aclassify", classify)):
+            hstspreload.cache_clear()
+            loop = asyncio.new_event_loop()
+            try:
+                per_host, longest = loop.run_until_complete(measure_loop(coroutine()))
+            finally:
+                loop.close()
+            results["%s %s" % (mode, name)] = {
+                "host_us": per_host,
+                "longest_stall_ms": longest,
+            }
+            print(
+                "%-13s %-9s: %.2f us/host, loop stalled for up to %.2f ms"
+                % (mode, name, per_host, longest)
+            )
+    return results
+
+
+def bench_threads(args):
+    # Every thread looks up different hosts so that none of them get the
+    # results of another from a shared cache.
+    names = [name for name, _ in load_entries()]
+    rand = random.Random(0)
+    thread_hosts = [
+        [
+            rand.choice((name, b"www." + name, b"not-preloaded-" + name + b".test"))
+            for name in rand.sample(names, args.hosts)
+        ]
+        for _ in range(16)
+    ]
+    gil = getattr(sys, "_is_gil_enabled", lambda: True)()
+    print("%s interpreter" % ("standard" if gil else "free-threaded"))
+    results = {"gil": gil}
+    for mode in ("per-call open", "resident", "concurrent", "load_all()"):
+        reset()
+        if mode == "resident":
+            hstspreload.load_resident()
+        elif mode == "concurrent":
+            hstspreload.load_concurrent()
+        elif mode == "load_all()":
+            hstspreload.load_all()
+
+        rates = results[mode] = {}
+        for threads in (1, 2, 4, 8, 16):
+            hstspreload.cache_clear()
+            barrier = threading.Barrier(threads + 1)
+
+            def work(hosts):
+                barrier.wait()
+                for host in hosts:
+                    hstspreload.in_hsts_preload(host)
+                barrier.wait()
+
+            workers = [
+                threading.Thread(target=work, args=(hosts,))
+                for hosts in thread_hosts[:threads]
+            ]
+            for worker in workers:
+                worker.start()
+            barrier.wait()
+            started = time.perf_counter()
+            barrier.wait()
+            seconds = time.perf_counter() - started
+            for worker in workers:
+                worker.join()
+            rates[threads] = threads * args.hosts / seconds
+        print(
+            "%-13s: %s lookups/s"
+            % (
+                mode,
+                ", ".join(
+                    "%d threads %.0fk" % (threads, rate / 1000)
+                    for threads, rate in rates.items()
+                ),
+            )
+        )
+    return results
+
+
+def bench_build(args):
+    build = load_build_script()
+    with tempfile.TemporaryDirectory() as tmp:
+        path = args.build_json
+        if path is None:
+            path = os.path.join(tmp, "transport_security_state_static.json")
+            write_json_fixture(path)
+
+        started = time.perf_counter()
+        with open(path) as f:
+            content = f.read()
+        results = {"read_seconds": time.perf_counter() - started}
+
+        started = time.perf_counter()
+        entries = build.parse_entries(content)
+        results["parse_seconds"] = time.perf_counter() - started
+        for version, encode in sorted(build.ENCODERS.items()):
+            started = time.perf_counter()
+            bin_data = encode(entries)
+            results["encode_v%d_seconds" % version] = time.perf_counter() - started
+
+        # Rebuild from a previous build without a thousand of the entries and
+        # with hosts removed since, as between two releases of the list.
+        previous = build.encode_v2(
+            entries[1000:] + [(b"removed-%d.example" % i, False) for i in range(500)]
+        )
+        with contextlib.redirect_stdout(io.StringIO()):
+            started = time.perf_counter()
+            bin_data = build.encode_v2(entries, previous)
+            results["encode_v2_incremental_seconds"] = time.perf_counter() - started
+
+            started = time.perf_counter()
+            build.report_bloom_filter(bin_data)
+            results["check_seconds"] = time.perf_counter() - started
+
+    print(
+        "%d entries: %s"
+        % (
+            len(entries),
+            ", ".join(
+                "%s %.2fs" % (stage[: -len("_seconds")], seconds)
+                for stage, seconds in results.items()
+            ),
+        )
+    )
+    return results
+
+
+def bench_reload(args):
+    hosts = load_hosts(args.hosts)
+    with open_pkg_binary("hstspreload.bin") as f:
+        data = f.read()
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "hstspreload.bin")
+        with open(path, "wb") as f:
+            f.write(data)
+        preload_list = hstspreload.HSTSPreloadList(path)
+        preload_list.set_cache_sizes(hosts=0)
+
+        def swap(version):
+            # Trailing bytes change the checksum but not the list.
+            new_path = os.path.join(tmp, "new.bin")
+            with open(new_path, "wb") as f:
+                f.write(data + b"\0" * version)
+            os.replace(new_path, path)
+            started = time.perf_counter()
+            assert preload_list.reload()
+            return time.perf_counter() - started
+
+        started = time.perf_counter()
+        preload_list.reload()
+        results = {"unchanged_ms": (time.perf_counter() - started) * 1e3}
+        results["changed_ms"] = min(swap(version) for version in range(1, 4)) * 1e3
+        results["lookup_us"] = measure(preload_list.in_hsts_preload, hosts)
+
+        # Keep reloading in another thread while looking up hosts.
+        done = threading.Event()
+
+        def reload_forever():
+            version = 4
+            while not done.is_set():
+                swap(version)
+                version += 1
+
+        thread = threading.Thread(target=reload_forever)
+        thread.start()
+        try:
+            results["lookup_while_reloading_us"] = measure(
+                preload_list.in_hsts_preload, hosts
+            )
+        finally:
+            done.set()
+            thread.join()
+
+    print(
+        "reload(): %.2f ms unchanged, %.2f ms to swap in a new list, "
+        "%.2f us/lookup, %.2f us/lookup while reloading"
+        % (
+            results["unchanged_ms"],
+            results["changed_ms"],
+            results["lookup_us"],
+            results["lookup_while_reloading_us"],
+        )
+    )
+    return results
+
+
+def bench_resident(args):
+    hosts = load_hosts(args.hosts)
+    # Bypass both caches so every call reads from the list.
+    hstspreload.set_cache_sizes(bucket_bytes=0)
+    lookup = uncached_lookup()
+
+    results = {"per-call open_us": measure(lookup, hosts)}
+    print("per-call open: %.2f us/lookup" % results["per-call open_us"])
+    hstspreload.load_resident()
+    results["resident_us"] = measure(lookup, hosts)
+    print("resident:      %.2f us/lookup" % results["resident_us"])
+    return results
+
+
+def bench_cache(args):
+    # Many distinct hosts spread over a few thousand registrable domains
+    rand = random.Random(0)
+    domains = [host.split(b".", 1)[-1] for host in load_hosts(2000)]
+    hosts = [
+        b"host-%d.%s" % (rand.randrange(1 << 30), rand.choice(domains))
+        for _ in range(args.hosts)
+    ]
+
+    results = {}
+    for bucket_bytes in (0, 1024 * 1024, 16 * 1024 * 1024):
+        hstspreload.set_cache_sizes(bucket_bytes=bucket_bytes)
+        hstspreload.cache_clear()
+        per_lookup = measure(hstspreload.in_hsts_preload, hosts, repeat=1)
+        info = hstspreload.cache_info()
+        results["%d KiB" % (bucket_bytes // 1024)] = {
+            "lookup_us": per_lookup,
+            "host_hit_percent": hit_rate(info["hosts"]),
+            "bucket_hit_percent": hit_rate(info["buckets"]),
+            "bucket_bytes_used": info["buckets"].currsize,
+        }
+        print(
+            "bucket cache of %5d KiB: %.2f us/lookup, host hit rate %.1f%%, "
+            "bucket hit rate %.1f%%, %d KiB used"
+            % (
+                bucket_bytes // 1024,
+                per_lookup,
+                hit_rate(info["hosts"]),
+                hit_rate(info["buckets"]),
+                info["buckets"].currsize // 1024,
+            )
+        )
+    return results
+
+
+def hit_rate(info):
+    return 100.0 * info.hits / max(1, info.hits + info.misses)
+
+
+def bench_eager(args):
+    hosts = load_hosts(args.hosts)
+    hstspreload.set_cache_sizes(bucket_bytes=0)
+    hstspreload.load_resident()
+    lookup = uncached_lookup()
+    results = {"resident_us": measure(lookup, hosts)}
+    print("resident:   %.2f us/lookup" % results["resident_us"])
+
+    info = hstspreload.load_all()
+    results.update(
+        load_all_us=measure(lookup, hosts),
+        load_seconds=info.seconds,
+        load_bytes=info.size,
+    )
+    print(
+        "load_all(): %.2f us/lookup, %d hosts loaded in %.0f ms using %d KiB"
+        % (results["load_all_us"], info.hosts, info.seconds * 1e3, info.size // 1024)
+    )
+    timer = timeit.Timer(lambda: hstspreload.in_hsts_preload_many(hosts))
+    results["load_all_batched_us"] = (
+        min(timer.repeat(repeat=3, number=1)) / len(hosts) * 1e6
+    )
+    print("load_all(): %.2f us/host batched" % results["load_all_batched_us"])
+    return results
+
+
+def load_urls(count, seed=0):
+    """Builds a corpus of crawl URLs for the sampled hosts, mostly 'http://'
+    with some credentials, ports, trailing dots and URLs that aren't HTTP"""
+    rand = random.Random(seed)
+    urls = []
+    for host in load_hosts(count, seed):
+        host = host.decode("ascii")
+        authority = rand.choice(
+            (host, host, host, host + ":80", host + ":8080", host + ".", "u:p@" + host)
+        )
+        path = rand.choice(
+            ("", "/", "/index.html", "/a/b/c?q=%d" % rand.randrange(1000), "/#top")
+        )
+        scheme = rand.choice(("http://",) * 8 + ("https://", "ftp://"))
+        urls.append(scheme + authority + path)
+    return urls
+
+
+def upgrade_with_urllib(urls):
+    """Upgrades URLs the way callers did before upgrade_urls()"""
+    for url in urls:
+        parts = urllib.parse.urlsplit(url)
+        if parts.scheme == "http" and parts.hostname:
+            hostname = parts.hostname.rstrip(".")
+            if hstspreload.in_hsts_preload(hostname):
+                netloc = parts.netloc
+                if parts.port == 80:
+                    netloc = netloc[: netloc.rfind(":")] + ":443"
+                url = parts._replace(scheme="https", netloc=netloc).geturl()
+        yield url
+
+
+def bench_urls(args):
+    urls = load_urls(args.hosts)
+    hstspreload.load_resident()
+    hstspreload.set_cache_sizes(hosts=len(urls))
+    results = {}
+    for name, upgrade in (
+        ("urllib.parse", upgrade_with_urllib),
+        ("upgrade_urls", hstspreload.upgrade_urls),
+    ):
+        # A cold host cache includes the lookups, a warm one is mostly parsing.
+        timings = []
+        for cold in (True, False):
+
+            def run():
+                if cold:
+                    hstspreload.cache_clear()
+                for _ in upgrade(urls):
+                    pass
+
+            seconds = min(timeit.Timer(run).repeat(repeat=3, number=1))
+            timings.append(seconds / len(urls) * 1e6)
+        print(
+            "%-12s %.2f us/URL with a cold host cache, %.2f us/URL with a warm one"
+            % (name + ":", timings[0], timings[1])
+        )
+        results[name] = {"cold_us": timings[0], "warm_us": timings[1]}
+    return results
+
+
+def load_headers(count, seed=0):
+    """Builds Host headers for the sampled hosts, some in uppercase, with a
+    port or a trailing dot, and with the Unicode labels of IDNs"""
+    rand = random.Random(seed)
+    headers = []
+    for host in load_hosts(count, seed):
+        host = host.decode("ascii")
+        if "xn--" in host:
+            try:
+                host = host.encode("ascii").decode("idna")
+            except UnicodeError:
+                pass
+        headers.append(
+            rand.choice(
+                (host, host, host.upper(), host + ":443", host + ".", host + ".:8443")
+            )
+        )
+    return headers
+
+
+def normalize_by_caller(header):
+    """Normalizes a Host header the way callers did before in_hsts_preload_host()"""
+    host = header.rpartition("@")[2]
+    if not host.startswith("["):
+        host = host.partition(":")[0]
+    return host.rstrip(".").encode("idna").lower()
+
+
+def bench_headers(args):
+    headers = load_headers(args.hosts)
+    hstspreload.load_resident()
+    hstspreload.set_cache_sizes(hosts=len(headers))
+    results = {
+        "idns": sum(1 for header in headers if max(header) > "\x7f"),
+        "distinct_headers": len(set(headers)),
+        "distinct_hosts": len(set(map(hstspreload.normalize_host, headers))),
+    }
+    print(
+        "%d headers with %d IDNs, %d distinct headers for %d distinct hosts"
+        % (
+            len(headers),
+            results["idns"],
+            results["distinct_headers"],
+            results["distinct_hosts"],
+        )
+    )
+    for name, lookup in (
+        (
+            "by caller",
+            lambda header: hstspreload.in_hsts_preload(normalize_by_caller(header)),
+        ),
+        ("normalize_host", hstspreload.normalize_host),
+        ("in_hsts_preload_host", hstspreload.in_hsts_preload_host),
+    ):
+        # Cold caches include the lookups and IDNA conversions.
+        timings = []
+        for cold in (True, False):
+
+            def run():
+                if cold:
+                    hstspreload.cache_clear()
+                    _idna_encode.cache_clear()
+                for header in headers:
+                    lookup(header)
+
+            seconds = min(timeit.Timer(run).repeat(repeat=3, number=1))
+            timings.append(seconds / len(headers) * 1e6)
+        print(
+            "%-21s %.2f us/header with cold caches, %.2f us/header with warm ones"
+            % (name + ":", timings[0], timings[1])
+        )
+        results[name] = {"cold_us": timings[0], "warm_us": timings[1]}
+    return results
+
+
+def import_times(path, env):
+    # Run with -X importtime in fresh interpreters, the second column
+    # is the cumulative import time of a module in microseconds.
+    self_times, cumulative_times = [], []
+    for _ in range(10):
+        output = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", "import hstspreload"],
+            cwd=path,
+            env=env,
+            stderr=subprocess.PIPE,
+            check=True,
+        ).stderr.decode()
+        for line in output.splitlines():
+            columns = [column.strip() for column in line.split("|")]
+            if columns[-1] == "hstspreload":
+                self_times.append(int(columns[0].split()[-1]))
+                cumulative_times.append(int(columns[1]))
+    return {
+        "self_us": statistics.median(self_times),
+        "cumulative_us": statistics.median(cumulative_times),
+    }
+
+
+def bench_import(args):
+    # Import a copy of the package so that whether its bytecode is cached
+    # doesn't depend on the environment, e.g. PYTHONDONTWRITEBYTECODE.
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        package = os.path.join(tmp, "hstspreload")
+        shutil.copytree(
+            os.path.dirname(hstspreload.__file__),
+            package,
+            ignore=shutil.ignore_patterns("__pycache__"),
+        )
+        env = dict(os.environ, PYTHONDONTWRITEBYTECODE="1")
+        env.pop("PYTHONPATH", None)
+        results["uncached"] = import_times(tmp, env)
+        compileall.compile_dir(package, quiet=1)
+        results["cached"] = import_times(tmp, env)
+
+    for name in ("cached", "uncached"):
+        print(
+            "import hstspreload, %s bytecode: %d us self, %d us cumulative"
+            % (name, results[name]["self_us"], results[name]["cumulative_us"])
+        )
+    load_index = _LoadedList(None, None).load_index
+    results["load_index_us"] = timeit.Timer(load_index).timeit(number=1) * 1e6
+    print("decoding the index: %.1f us" % results["load_index_us"])
+    return results
+
+
+def bench_many(args):
+    results = {}
+    for count in (10000, 1000000):
+        hosts = load_hosts(count)
+        # Both on the same hosts, so that they get the same cache hits.
+        repeat = 3 if count < 100000 else 1
+        for mode in ("per-call", "resident"):
+            reset()
+            if mode == "resident":
+                hstspreload.load_resident()
+            single = measure(uncached_lookup(), hosts, repeat=repeat)
+            hstspreload.cache_clear()
+            timer = timeit.Timer(lambda: hstspreload.in_hsts_preload_many(hosts))
+            many = min(timer.repeat(repeat=repeat, number=1)) / count * 1e6
+            print(
+                "%d hosts, %s: %.2f us/host one by one, %.2f us/host batched (%.1fx)"
+                % (count, mode, single, many, single / many)
+            )
+            results["%d hosts, %s" % (count, mode)] = {
+                "single_us": single,
+                "batched_us": many,
+            }
+    reset()
+    return results
+
+
+def bench_packed(args):
+    # A column of hosts like the ones analytics jobs read from Parquet.
+    hosts = load_hosts(args.hosts) * 10
+    data = b"".join(hosts)
+    offsets = [0]
+    for host in hosts:
+        offsets.append(offsets[-1] + len(host))
+    try:
+        import numpy
+    except ImportError:
+        numpy = None
+        print("NumPy isn't installed, in_hsts_preload_packed() looks up one by one")
+    hstspreload.load_resident()
+    results = {"numpy": numpy is not None}
+    for name, func in (
+        ("in_hsts_preload_many", lambda: hstspreload.in_hsts_preload_many(hosts)),
+        (
+            "in_hsts_preload_packed",
+            lambda: hstspreload.in_hsts_preload_packed(data, offsets),
+        ),
+    ):
+        # The first call builds the sorted table of entries.
+        started = time.perf_counter()
+        func()
+        first_seconds = time.perf_counter() - started
+        seconds = min(timeit.Timer(func).repeat(repeat=3, number=1))
+        results[name] = {
+            "first_seconds": first_seconds,
+            "hosts_per_second": len(hosts) / seconds,
+        }
+        print(
+            "%-23s %.0f hosts/s, the first call took %.2fs"
+            % (name + ":", len(hosts) / seconds, first_seconds)
+        )
+    return results
+
+
+def bench_scan(args):
+    data = load_build_script().encode_v1(load_entries())
+    index = _read_index(_buffer_reader(data))
+    # Scan every layer-1 bucket end to end, looking for a label that isn't there.
+    buckets = [bucket[1:] for bucket in index.jump_table[1] if bucket is not None]
+    label = b"not-preloaded"
+
+    def legacy():
+        for offset, size in buckets:
+            for is_leaf, _, ent_label in legacy_iter_entries(
+                bytearray(data[offset : offset + size])
+            ):
+                if not is_leaf and ent_label == label:
+                    break
+
+    def zero_copy():
+        for offset, size in buckets:
+            _scan_bucket(data, offset, offset + size, label, label, False)
+
+    total = sum(size for _, size in buckets)
+    results = {}
+    for name, func in (("legacy", legacy), ("zero-copy", zero_copy)):
+        seconds = min(timeit.Timer(func).repeat(repeat=3, number=1))
+        results[name] = {
+            "bucket_us": seconds / len(buckets) * 1e6,
+            "mb_per_second": total / seconds / 1e6,
+        }
+        print(
+            "%-9s %.1f us/bucket, %.1f MB/s"
+            % (name, results[name]["bucket_us"], results[name]["mb_per_second"])
+        )
+    return results
+
+
+def trace_lookup(index, data, host):
+    """Returns the bytes read and entries compared when scanning for 'host'"""
+    lowered = host.lower()
+    labels = lowered.split(b".")
+    bytes_read = compared = 0
+    if labels[-1] in _GTLD_INCLUDE_SUBDOMAINS:
+        return bytes_read, compared
+
+    start = len(host) + 1
+    for layer, label in enumerate(labels[::-1]):
+        if layer > 4:
+            break
+        start -= len(label) + 1
+        key = lowered[start:] if index.keyed_by_suffix else label
+        bucket = index.locate(layer, key)
+        if bucket is None:
+            break
+        bytes_read += bucket[2]
+        entries = list(_iter_entries(data, bucket[1], bucket[1] + bucket[2]))
+
+        if index.keyed_by_suffix:
+            # Bisect the sorted entries
+            lo, hi = 0, len(entries)
+            while lo < hi:
+                compared += 1
+                mid = (lo + hi) // 2
+                if entries[mid][1] < key:
+                    lo = mid + 1
+                elif entries[mid][1] > key:
+                    hi = mid
+                else:
+                    break
+        else:
+            # Walk the entries until one matches
+            for flags, ent_label in entries:
+                compared += 1
+                if ent_label == (host[start:] if flags & _IS_LEAF else label):
+                    break
+
+        found = index.scan(data, bucket[1], bucket, key, host[start:], start == 0)
+        if found != _HAS_CHILDREN:
+            break
+    return bytes_read, compared
+
+
+def trace_walk(index, data, host):
+    """Same as trace_lookup() for an index that walks the labels of a host"""
+    lowered = host.lower()
+    labels = lowered.split(b".")
+    if labels[-1] in _GTLD_INCLUDE_SUBDOMAINS:
+        return 0, 0
+    stats = _Stats(histogram=False)
+    index.walk(host, lowered, labels[::-1], _buffer_reader(data), stats)
+    return stats.bytes_read, stats.entries_read
+
+
+# Prints how much the resident set of a fresh interpreter grows by loading
+# a list and looking up the hosts read from stdin, in KiB.
+RESIDENT_MEMORY_SCRIPT = """
+import os, sys
+import hstspreload
+
+def resident_kib():
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") // 1024
+
+hosts = sys.stdin.buffer.read().split()
+before = resident_kib()
+preload_list = hstspreload.HSTSPreloadList(sys.argv[1])
+preload_list.load_resident()
+preload_list.set_cache_sizes(hosts=0, bucket_bytes=0)
+for host in hosts:
+    preload_list.in_hsts_preload(host)
+print(resident_kib() - before)
+"""
+
+
+def measure_resident_memory(data, hosts):
+    """Returns the KiB looking up 'hosts' in the resident list encoded in
+    'data' adds to a process, or None where that can't be measured"""
+    if not os.path.exists("/proc/self/statm"):
+        return None
+    fd, path = tempfile.mkstemp(suffix=".bin")
+    with os.fdopen(fd, "wb") as f:
+        f.write(data)
+    try:
+        output = subprocess.run(
+            [sys.executable, "-c", RESIDENT_MEMORY_SCRIPT, path],
+            input=b"\n".join(hosts),
+            stdout=subprocess.PIPE,
+            check=True,
+        ).stdout
+    finally:
+        os.remove(path)
+    return int(output)
+
+
+def bench_formats(args):
+    build = load_build_script()
+    entries = load_entries()
+    hosts = load_hosts(args.hosts)
+
+    results = {}
+    for version, encode in sorted(build.ENCODERS.items()):
+        data = encode(entries)
+        index = _read_index(_buffer_reader(data))
+        trace = trace_walk if index.walks_labels else trace_lookup
+        traces = [trace(index, data, host) for host in hosts]
+        use_list(data)
+        hstspreload.set_cache_sizes(bucket_bytes=0)
+        result = results["version %d" % version] = {
+            "lookup_us": measure(uncached_lookup(), hosts),
+        }
+        hstspreload.load_resident()
+        result.update(
+            {
+                "resident_us": measure(uncached_lookup(), hosts),
+                "resident_kib": measure_resident_memory(data, hosts),
+                "bytes_read": statistics.mean(bytes_read for bytes_read, _ in traces),
+                "entries_compared": statistics.mean(compared for _, compared in traces),
+                "file_bytes": len(data),
+            }
+        )
+        print(
+            "version %d: %.2f us/lookup, %.2f us resident, %.0f bytes read and "
+            "%.1f entries compared per lookup, %d KiB file, %s KiB resident"
+            % (
+                version,
+                result["lookup_us"],
+                result["resident_us"],
+                result["bytes_read"],
+                result["entries_compared"],
+                len(data) // 1024,
+                result["resident_kib"],
+            )
+        )
+    return results
+
+
+BENCHMARKS = {
+    "async": bench_async,
+    "build": bench_build,
+    "cache": bench_cache,
+    "eager": bench_eager,
+    "formats": bench_formats,
+    "headers": bench_headers,
+    "import": bench_import,
+    "lookups": bench_lookups,
+    "many": bench_many,
+    "misses": bench_misses,
+    "packed": bench_packed,
+    "reload": bench_reload,
+    "resident": bench_resident,
+    "scan": bench_scan,
+    "threads": bench_threads,
+    "urls": bench_urls,
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "benchmarks",
+        nargs="*",
+        help="benchmarks to run out of %s, defaults to all of them"
+        % ", ".join(sorted(BENCHMARKS)),
+    )
+    parser.add_argument(
+        "--hosts", type=int, default=10000, help="number of hosts to look up"
+    )
+    parser.add_argument(
+        "--build-json",
+        help="HSTS preload list JSON to time the build on, "
+        "defaults to one generated from hstspreload.bin",
+    )
+    parser.add_argument("--output", help="file to save the results to as JSON")
+    args = parser.parse_args()
+    for name in args.benchmarks:
+        if name not in BENCHMARKS:
+            parser.error("unknown benchmark: %r" % name)
+
+    results = {}
+    for name in args.benchmarks or sorted(BENCHMARKS):
+        print("Running %r benchmark..." % name)
+        reset()
+        results[name] = BENCHMARKS[name](args)
+    reset()
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(
+                {
+                    "hstspreload": hstspreload.__version__,
+                    "python": platform.python_version(),
+                    "platform": platform.platform(),
+                    "time": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+                    "hosts": args.hosts,
+                    "benchmarks": results,
+                },
+                f,
+                indent=2,
+                sort_keys=True,
+            )
+        print("Saved results to %r" % args.output)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
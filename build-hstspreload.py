@@ -1,16 +1,38 @@
 """Builds the hstspreload.bin file"""
 
+import argparse
 import base64
+import collections
+import contextlib
 import datetime
 import hashlib
 import json
+import math
+import os
 import re
 import struct
 import sys
+import time
+import zlib
 
 import urllib3
 
-from hstspreload import _INCLUDE_SUBDOMAINS, _IS_LEAF, _crc8
+from hstspreload._list import (
+    _HAS_CHILDREN,
+    _HEADER,
+    _INCLUDE_SUBDOMAINS,
+    _IS_LEAF,
+    _JUMP_INFO,
+    _MAGIC,
+    _SECTION,
+    _SECTION_COUNT,
+    _TRIE_OFFSET,
+    _bloom_hashes,
+    _buffer_reader,
+    _crc8,
+    _iter_entries,
+    _read_index,
+)
 
 HSTS_PRELOAD_URL = (
     "https://chromium.googlesource.com/chromium/src/+/main/"
@@ -18,66 +40,201 @@ HSTS_PRELOAD_URL = (
 )
 VERSION_RE = re.compile(r"^__version__\s+=\s+\"[\d.]+\"", re.MULTILINE)
 CHECKSUM_RE = re.compile(r"^__checksum__\s+=\s+\"([a-f0-9]*)\"", re.MULTILINE)
-JUMPTABLE_RE = re.compile(r"^_JUMPTABLE\s+=\s+[^\n]+$", re.MULTILINE)
 GTLD_INCLUDE_SUBDOMAINS_RE = re.compile(
     r"^_GTLD_INCLUDE_SUBDOMAINS\s+=\s+[^\n]+$", re.MULTILINE
 )
+# Lines of the list that are only a comment, which JSON doesn't allow.
+COMMENT_RE = re.compile(r"\n[ \t]*//[^\n]*")
+# Average number of entries per bucket in format version 2.
+ENTRIES_PER_BUCKET = 4
+# Bits of the Bloom filter per preloaded host in format version 2.
+BLOOM_BITS_PER_HOST = 10
+# Hash functions of the Bloom filter, the number that minimizes false positives.
+BLOOM_HASHES = max(1, round(BLOOM_BITS_PER_HOST * math.log(2)))
+# Sections of format version 2 in the order they are written.
+SECTIONS = [b"BKTS", b"OFFS", b"ENTS", b"BLOM", b"GTLD"]
+# Records per block of a trie node in format version 3, lookups bisect the
+# blocks of a node.
+TRIE_RECORDS_PER_BLOCK = 16
 
 
 def main():
-    print("Downloading latest HSTS preload list...")
-    http = urllib3.PoolManager()
-    r = http.request(
-        "GET",
-        HSTS_PRELOAD_URL,
-        headers={"Accept": "application/json"},
-        preload_content=True,
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--format-version",
+        type=int,
+        choices=sorted(ENCODERS),
+        default=2,
+        help="version of the hstspreload.bin format to write",
+    )
+    parser.add_argument(
+        "--input",
+        help="read the list from a local JSON file, '-' for stdin, "
+        "instead of downloading it",
+    )
+    parser.add_argument(
+        "--output",
+        help="write the list to this file instead of updating the package",
+    )
+    parser.add_argument(
+        "--previous",
+        help="an earlier build in format version 2 to update instead of "
+        "encoding every entry again",
     )
-    content = base64.b64decode(r.data)
+    args = parser.parse_args()
+    if args.previous and args.format_version != 2:
+        parser.error("--previous needs --format-version 2")
+    stages = Stages()
+
+    if args.input is None:
+        with stages.stage("download", "Downloading latest HSTS preload list..."):
+            http = urllib3.PoolManager()
+            r = http.request(
+                "GET",
+                HSTS_PRELOAD_URL,
+                headers={"Accept": "application/json"},
+                preload_content=True,
+            )
+            content = base64.b64decode(r.data)
+    else:
+        with stages.stage("read", "Reading HSTS preload list from %s..." % args.input):
+            if args.input == "-":
+                content = sys.stdin.buffer.read()
+            else:
+                with open(args.input, "rb") as f:
+                    content = f.read()
     content_checksum = hashlib.sha256(content).hexdigest()
     content = content.decode("ascii")
-    print("Checksum of downloaded list is: %s" % content_checksum)
-
-    with open("hstspreload/__init__.py", "r") as f:
-        data = f.read()
-    current_checksum = CHECKSUM_RE.search(data).group(1)
-    print("Checksum of current list is: %s" % current_checksum)
-    if current_checksum == content_checksum:
-        print("Detected no changes to HSTS preload list, cancelling build...")
-        return 1
-
-    print("Parsing HSTS preload entries...")
-    entries = json.loads(
-        "\n".join(
-            [line for line in content.split("\n") if not line.strip().startswith("//")]
+    print("Checksum of the list is: %s" % content_checksum)
+
+    if args.output is None:
+        with open("hstspreload/__init__.py", "r") as f:
+            package_data = f.read()
+        current_checksum = CHECKSUM_RE.search(package_data).group(1)
+        print("Checksum of current list is: %s" % current_checksum)
+        if current_checksum == content_checksum:
+            print("Detected no changes to HSTS preload list, cancelling build...")
+            return 1
+
+    with stages.stage("parse", "Parsing HSTS preload entries..."):
+        entries = parse_entries(content)
+
+    with stages.stage(
+        "encode", "Encoding entries into format version %d..." % args.format_version
+    ):
+        if args.previous:
+            with open(args.previous, "rb") as f:
+                bin_data = encode_v2(entries, previous=f.read())
+        else:
+            bin_data = ENCODERS[args.format_version](entries)
+
+    with stages.stage("check", "Checking the Bloom filter..."):
+        report_bloom_filter(bin_data)
+
+    output = args.output or "hstspreload/hstspreload.bin"
+    with stages.stage("write", "Writing data into %s..." % output):
+        # Rename the new file over the old one, which processes may have mapped.
+        with open(output + ".tmp", "wb") as f:
+            f.write(bin_data)
+        os.replace(output + ".tmp", output)
+
+    if args.output is None:
+        with stages.stage(
+            "update",
+            "Updating __version__, __checksum__ and _GTLD_INCLUDE_SUBDOMAINS...",
+        ):
+            update_package(package_data, content_checksum, entries)
+
+    stages.report()
+    return 0
+
+
+def update_package(data, content_checksum, entries):
+    """Updates __version__, __checksum__ and _GTLD_INCLUDE_SUBDOMAINS in the
+    package, 'data' is the current content of its '__init__.py'"""
+    today = datetime.date.today()
+    # render the gtld subdomains in sorted order
+    str_gtld_include_subdomains = (
+        "{"
+        + ", ".join([str(e) for e in sorted(gtld_include_subdomains(entries))])
+        + "}"
+    )
+    data = VERSION_RE.sub(
+        '__version__ = "%d.%d.%d"' % (today.year, today.month, today.day), data, re.M
+    )
+    data = CHECKSUM_RE.sub('__checksum__ = "%s"' % content_checksum, data)
+    data = GTLD_INCLUDE_SUBDOMAINS_RE.sub(
+        "_GTLD_INCLUDE_SUBDOMAINS = %s  # noqa: E501" % str_gtld_include_subdomains,
+        data,
+    )
+    with open("hstspreload/__init__.py", "w") as f:
+        f.truncate()
+        f.write(data)
+
+
+class Stages:
+    """Times the stages of the build"""
+
+    def __init__(self):
+        self.seconds = []
+
+    @contextlib.contextmanager
+    def stage(self, name, message):
+        print(message)
+        started = time.perf_counter()
+        yield
+        self.seconds.append((name, time.perf_counter() - started))
+
+    def report(self):
+        total = sum(seconds for _, seconds in self.seconds)
+        print(
+            "Built in %.2fs: %s"
+            % (
+                total,
+                ", ".join(
+                    "%s %.2fs" % (name, seconds) for name, seconds in self.seconds
+                ),
+            )
         )
-    )["entries"]
 
-    layers = {}
-    gtld_include_subdomains = set()
 
-    for entry in entries:
-        name = entry["name"].encode("ascii")
+def parse_entries(content):
+    """Returns the (name, include_subdomains) of every entry that forces HTTPS"""
+    # Comments are removed in place so that the list is only scanned once
+    # before decoding it, the newline keeps a comment on the first line.
+    entries = json.loads(COMMENT_RE.sub("", "\n" + content))["entries"]
+    return [
+        (entry["name"].encode("ascii"), entry.get("include_subdomains", False))
+        for entry in entries
+        if entry.get("mode", "") == "force-https"
+    ]
+
+
+def gtld_include_subdomains(entries):
+    return {
+        name
+        for name, include_subdomains in entries
+        if include_subdomains and b"." not in name
+    }
+
+
+def encode_v1(entries):
+    """Encodes entries into buckets by layer and crc8 of the label in that layer"""
+    layers = {}
+    for name, include_subdomains in entries:
         labels = name.split(b".")[::-1]
-        include_subdomains = entry.get("include_subdomains", False)
-        force_https = entry.get("mode", "") == "force-https"
-
-        if force_https:
-            for i, label in enumerate(labels):
-                is_leaf = i == (len(labels) - 1)
-                checksum = _crc8(label)
-                labs = layers.setdefault((i, checksum), set())
-                labs.add(
-                    (
-                        is_leaf,
-                        include_subdomains if is_leaf else False,
-                        name if is_leaf else label,
-                    )
+        for i, label in enumerate(labels):
+            is_leaf = i == (len(labels) - 1)
+            checksum = _crc8(label)
+            labs = layers.setdefault((i, checksum), set())
+            labs.add(
+                (
+                    is_leaf,
+                    include_subdomains if is_leaf else False,
+                    name if is_leaf else label,
                 )
-                if i == 0 and is_leaf and include_subdomains:
-                    gtld_include_subdomains.add(name)
+            )
 
-    print("Encoding labels into binary...")
     bin_layers = {}
     for layer in range(5):
         for checksum in range(256):
@@ -91,58 +248,403 @@ def main():
                     flags |= _IS_LEAF
                 if include_subdomains:
                     flags |= _INCLUDE_SUBDOMAINS
-                if len(label) > 0xFF:
-                    raise ValueError("label too long for encoding scheme: %r" % label)
-                chunks.append(struct.pack("<BB", flags, len(label)) + label)
+                chunks.append(encode_entry(flags, label))
 
             bin_layers[(layer, checksum)] = b"".join(chunks)
 
-    print("Encoding layer offsets into jump table...")
     jump_table = []
-    current_offset = 0
+    current_offset = _HEADER.size + 5 * 256 * _JUMP_INFO.size
     for layer in range(5):
-        jump_table_for_layer = []
         for checksum in range(256):
-            bin_layer = bin_layers[(layer, checksum)]
-            if not bin_layer:
-                jump_table_for_layer.append(None)
-            else:
-                layer_len = len(bin_layer)
-                jump_table_for_layer.append((current_offset, layer_len))
-                current_offset += layer_len
-        jump_table.append(jump_table_for_layer)
+            layer_len = len(bin_layers[(layer, checksum)])
+            # Empty buckets are stored as (0, 0)
+            jump_table.append(
+                _JUMP_INFO.pack(current_offset if layer_len else 0, layer_len)
+            )
+            current_offset += layer_len
 
-    print("Writing data into hstspreload.bin...")
-    with open("hstspreload/hstspreload.bin", "wb") as f:
-        f.truncate()
-        for layer in range(5):
-            for checksum in range(256):
-                f.write(bin_layers[(layer, checksum)])
+    return b"".join(
+        [_HEADER.pack(_MAGIC, 1)]
+        + jump_table
+        + [
+            bin_layers[(layer, checksum)]
+            for layer in range(5)
+            for checksum in range(256)
+        ]
+    )
 
-    print(
-        "Updating __version__, __checksum__, _JUMPTABLE and _GTLD_INCLUDE_SUBDOMAINS..."
+
+def encode_v2(entries, previous=None):
+    """Encodes every suffix of the entries into buckets by crc32 of the suffix,
+    sorted within each bucket and with the offset of every entry.
+
+    With 'previous', an earlier build in format version 2, only the entries
+    that differ from it are encoded: its suffixes are updated, its buckets
+    without changes are copied and its Bloom filter is kept if the hosts are
+    the same. The output is the same as without it."""
+    previous_index = previous_bloom = changed = None
+    if previous is not None:
+        previous_index = _read_index(_buffer_reader(previous))
+        previous_bloom = previous_index.bloom
+        if not previous_index.keyed_by_suffix:
+            print("Encoding every entry, the previous build isn't in format 2")
+            previous_index = previous_bloom = None
+    if previous_index is None:
+        suffixes = suffix_flags(entries)
+    else:
+        suffixes = decode_suffixes(previous, previous_index)
+        changed = update_suffix_flags(suffixes, entries)
+    hosts = [suffix for suffix, flags in suffixes.items() if flags & _IS_LEAF]
+
+    bucket_count = 1
+    while bucket_count * ENTRIES_PER_BUCKET < len(suffixes):
+        bucket_count *= 2
+    mask = bucket_count - 1
+    if changed is not None and len(previous_index.buckets) == bucket_count + 1:
+        # Changed buckets are the previous suffixes still there and the
+        # changed ones, every other bucket is copied.
+        buckets = {}
+        for suffix in changed:
+            buckets.setdefault(zlib.crc32(suffix) & mask, set()).add(suffix)
+        for bucket, bucket_suffixes in buckets.items():
+            first = previous_index.buckets[bucket]
+            last = previous_index.buckets[bucket + 1]
+            for _, suffix in _iter_entries(
+                previous,
+                previous_index.offsets[first],
+                previous_index.offsets[last],
+            ):
+                bucket_suffixes.add(suffix)
+            buckets[bucket] = [
+                suffix for suffix in bucket_suffixes if suffix in suffixes
+            ]
+        print("Encoding %d changed buckets out of %d" % (len(buckets), bucket_count))
+    else:
+        if changed is not None:
+            print("Encoding every bucket, the number of buckets changed")
+            previous_index = None
+        buckets = [[] for _ in range(bucket_count)]
+        for suffix in suffixes:
+            buckets[zlib.crc32(suffix) & mask].append(suffix)
+
+    # Entries start after the header, the section table, the index of the
+    # first entry of every bucket and the offset of every entry.
+    current_offset = (
+        _HEADER.size
+        + _SECTION_COUNT.size
+        + len(SECTIONS) * _SECTION.size
+        + 4 * (bucket_count + 1)
+        + 4 * (len(suffixes) + 1)
     )
-    with open("hstspreload/__init__.py", "r") as f:
-        data = f.read()
-    today = datetime.date.today()
-    # render the gtld subdomains in sorted order
-    str_gtld_include_subdomains = (
-        "{" + ", ".join([str(e) for e in sorted(gtld_include_subdomains)]) + "}"
+    bucket_starts = []
+    offsets = []
+    chunks = []
+    bucket = 0
+    while bucket < bucket_count:
+        if previous_index is None or bucket in buckets:
+            bucket_starts.append(len(offsets))
+            for suffix in sorted(buckets[bucket]):
+                chunk = encode_entry(suffixes[suffix], suffix)
+                offsets.append(current_offset)
+                chunks.append(chunk)
+                current_offset += len(chunk)
+            bucket += 1
+            continue
+
+        # Copy the entries of every bucket up to the next changed one at once.
+        end = bucket + 1
+        while end < bucket_count and end not in buckets:
+            end += 1
+        first = previous_index.buckets[bucket]
+        last = previous_index.buckets[end]
+        bucket_starts.extend(
+            [
+                len(offsets) + start - first
+                for start in previous_index.buckets[bucket:end]
+            ]
+        )
+        start = previous_index.offsets[first]
+        delta = current_offset - start
+        offsets.extend(
+            [offset + delta for offset in previous_index.offsets[first:last]]
+        )
+        chunk = previous[start : previous_index.offsets[last]]
+        chunks.append(chunk)
+        current_offset += len(chunk)
+        bucket = end
+    bucket_starts.append(len(offsets))
+    offsets.append(current_offset)
+
+    if (
+        previous_bloom is not None
+        and previous_bloom.hashes == BLOOM_HASHES
+        and len(previous_bloom.bits) == bloom_filter_size(len(hosts))
+        and not any(
+            (flags ^ suffixes.get(suffix, 0)) & _IS_LEAF
+            for suffix, flags in changed.items()
+        )
+    ):
+        # The same hosts set the same bits.
+        bloom_filter = struct.pack("<B", BLOOM_HASHES) + previous_bloom.bits
+    else:
+        bloom_filter = encode_bloom_filter(hosts)
+
+    sections = [
+        (b"BKTS", struct.pack("<%dI" % len(bucket_starts), *bucket_starts)),
+        (b"OFFS", struct.pack("<%dI" % len(offsets), *offsets)),
+        (b"ENTS", b"".join(chunks)),
+        (b"BLOM", bloom_filter),
+        (b"GTLD", encode_gtlds(entries)),
+    ]
+    assert [tag for tag, _ in sections] == SECTIONS
+    return encode_sections(2, sections)
+
+
+def parent_suffix(suffix):
+    return suffix.partition(b".")
+
+
+def decode_suffixes(data, index):
+    """Returns the flags of every suffix in 'data', a list in format version 2"""
+    offsets = index.offsets
+    return dict(
+        zip(
+            [data[start + 2 : end] for start, end in zip(offsets, offsets[1:])],
+            [data[start] for start in offsets[:-1]],
+        )
     )
-    data = VERSION_RE.sub(
-        '__version__ = "%d.%d.%d"' % (today.year, today.month, today.day), data, re.M
+
+
+def update_suffix_flags(suffixes, entries):
+    """Updates 'suffixes', the suffix_flags() of earlier entries, in place to
+    those of 'entries' and returns the earlier flags of every suffix that
+    changed, 0 for new suffixes"""
+    leaf_flags = _IS_LEAF | _INCLUDE_SUBDOMAINS
+    hosts = [entry for entry in entries if entry[0].count(b".") < 5]
+    leaves = {
+        name: leaf_flags if include_subdomains else _IS_LEAF
+        for name, include_subdomains in hosts
+    }
+    get = leaves.get
+    if len(leaves) < len(hosts):
+        # Hosts listed more than once, with either flags.
+        for name, include_subdomains in hosts:
+            if include_subdomains:
+                leaves[name] = leaf_flags
+    # Names of more than 5 labels only set _HAS_CHILDREN on their suffixes,
+    # those of 5 labels have no children in 'suffixes' to tell.
+    deep = set()
+    if len(hosts) < len(entries):
+        for name, _ in entries:
+            if name.count(b".") >= 5:
+                dot = len(name)
+                for _ in range(5):
+                    dot = name.rfind(b".", 0, dot)
+                deep.add(name[dot + 1 :])
+
+    changed = {
+        suffix: flags
+        for suffix, flags in suffixes.items()
+        if flags & leaf_flags != get(suffix, 0)
+    }
+    for suffix in changed:
+        suffixes[suffix] = suffixes[suffix] & _HAS_CHILDREN | get(suffix, 0)
+    added = [name for name in leaves if name not in suffixes]
+    added.extend(name for name in deep if name not in suffixes)
+    for name in added:
+        # Names can be a suffix of one added before.
+        suffixes[name] = suffixes.get(name, 0) | get(name, 0)
+        changed[name] = 0
+        # Every suffix of a suffix is one too, with children.
+        dot = name.find(b".")
+        while dot >= 0:
+            suffix = name[dot + 1 :]
+            flags = suffixes.get(suffix)
+            if flags is None:
+                suffixes[suffix] = _HAS_CHILDREN
+                changed[suffix] = 0
+            elif not flags & _HAS_CHILDREN:
+                suffixes[suffix] = flags | _HAS_CHILDREN
+                changed.setdefault(suffix, flags)
+                break
+            else:
+                break
+            dot = name.find(b".", dot + 1)
+    for suffix in deep:
+        flags = suffixes[suffix]
+        if not flags & _HAS_CHILDREN:
+            suffixes[suffix] = flags | _HAS_CHILDREN
+            changed.setdefault(suffix, flags)
+
+    # Suffixes that are no longer hosts may have no children left either,
+    # and those of 5 labels only have children in 'deep'.
+    pending = [suffix for suffix in changed if not suffixes[suffix] & leaf_flags]
+    pending.extend(
+        suffix
+        for suffix, flags in suffixes.items()
+        if flags & _HAS_CHILDREN and suffix not in deep and suffix.count(b".") == 4
     )
-    data = CHECKSUM_RE.sub('__checksum__ = "%s"' % content_checksum, data)
-    data = JUMPTABLE_RE.sub("_JUMPTABLE = %s  # noqa: E501" % str(jump_table), data)
-    data = GTLD_INCLUDE_SUBDOMAINS_RE.sub(
-        "_GTLD_INCLUDE_SUBDOMAINS = %s  # noqa: E501" % str_gtld_include_subdomains,
-        data,
+    if not pending:
+        return changed
+    children = collections.Counter(
+        parent for _, dot, parent in map(parent_suffix, suffixes) if dot
     )
-    with open("hstspreload/__init__.py", "w") as f:
-        f.truncate()
-        f.write(data)
+    while pending:
+        suffix = pending.pop()
+        flags = suffixes.get(suffix)
+        if flags is None:
+            continue
+        new_flags = flags & leaf_flags
+        if children[suffix] or suffix in deep:
+            new_flags |= _HAS_CHILDREN
+        if new_flags == flags != 0:
+            continue
+        changed.setdefault(suffix, flags)
+        if new_flags:
+            suffixes[suffix] = new_flags
+            continue
+        # Neither a host nor a suffix of one anymore.
+        del suffixes[suffix]
+        _, dot, parent = parent_suffix(suffix)
+        if dot:
+            children[parent] -= 1
+            pending.append(parent)
+    return changed
 
-    return 0
+
+def suffix_flags(entries):
+    """Returns the flags of every suffix of the entries that starts at a label"""
+    suffixes = {}
+    get = suffixes.get
+    for name, include_subdomains in entries:
+        flags = _IS_LEAF | (_INCLUDE_SUBDOMAINS if include_subdomains else 0)
+        dot = len(name)
+        # None of our layers are greater than 5 deep.
+        for _ in range(5):
+            dot = name.rfind(b".", 0, dot)
+            if dot < 0:
+                suffixes[name] = get(name, 0) | flags
+                break
+            suffix = name[dot + 1 :]
+            suffixes[suffix] = get(suffix, 0) | _HAS_CHILDREN
+    return suffixes
+
+
+def encode_gtlds(entries):
+    return b"".join(
+        encode_entry(_IS_LEAF | _INCLUDE_SUBDOMAINS, name)
+        for name in sorted(gtld_include_subdomains(entries))
+    )
+
+
+def encode_sections(version, sections):
+    """Encodes the header, the section table and the (tag, data) sections"""
+    header = [_HEADER.pack(_MAGIC, version), _SECTION_COUNT.pack(len(sections))]
+    section_offset = _HEADER.size + _SECTION_COUNT.size + len(sections) * _SECTION.size
+    for tag, section in sections:
+        header.append(_SECTION.pack(tag, section_offset, len(section)))
+        section_offset += len(section)
+    return b"".join(header + [section for _, section in sections])
+
+
+def encode_v3(entries):
+    """Encodes the labels of the entries into a trie from the TLD down, storing
+    identical sub-tries only once"""
+    # Every node maps a label to its flags and the labels below it.
+    root = {}
+    for suffix, flags in suffix_flags(entries).items():
+        if not flags & _IS_LEAF:
+            continue
+        node = root
+        labels = suffix.split(b".")[::-1]
+        for label in labels[:-1]:
+            node = node.setdefault(label, [0, {}])[1]
+        node.setdefault(labels[-1], [0, {}])[0] |= flags & (
+            _IS_LEAF | _INCLUDE_SUBDOMAINS
+        )
+
+    # The root offset comes first, nodes are written after their children.
+    chunks = [b""]
+    offsets = {}
+    size = _TRIE_OFFSET.size
+
+    def encode_node(node):
+        nonlocal size
+        records = []
+        for label in sorted(node):
+            flags, children = node[label]
+            if children:
+                records.append(
+                    encode_entry(flags | _HAS_CHILDREN, label)
+                    + _TRIE_OFFSET.pack(encode_node(children))
+                )
+            else:
+                records.append(encode_entry(flags, label))
+        blocks = [
+            b"".join(records[i : i + TRIE_RECORDS_PER_BLOCK])
+            for i in range(0, len(records), TRIE_RECORDS_PER_BLOCK)
+        ]
+        table = [len(blocks)]
+        block_offset = _TRIE_OFFSET.size * (len(blocks) + 2)
+        for block in blocks:
+            table.append(block_offset)
+            block_offset += len(block)
+        table.append(block_offset)
+        chunk = struct.pack("<%dI" % len(table), *table) + b"".join(blocks)
+        offset = offsets.get(chunk)
+        if offset is None:
+            offset = offsets[chunk] = size
+            chunks.append(chunk)
+            size += len(chunk)
+        return offset
+
+    chunks[0] = _TRIE_OFFSET.pack(encode_node(root))
+    return encode_sections(
+        3, [(b"TRIE", b"".join(chunks)), (b"GTLD", encode_gtlds(entries))]
+    )
+
+
+def encode_bloom_filter(hosts):
+    """Encodes a Bloom filter over hosts with BLOOM_BITS_PER_HOST bits per host
+    and BLOOM_HASHES hash functions"""
+    bits = bytearray(bloom_filter_size(len(hosts)))
+    size = len(bits) * 8
+    masks = [1 << i for i in range(8)]
+    hashes = range(BLOOM_HASHES)
+    for h1, h2 in map(_bloom_hashes, hosts):
+        # Bit 'i' of a host is (h1 + i * h2) % size.
+        bit, step = h1 % size, h2 % size
+        for _ in hashes:
+            bits[bit >> 3] |= masks[bit & 7]
+            bit = (bit + step) % size
+    return struct.pack("<B", BLOOM_HASHES) + bytes(bits)
+
+
+def bloom_filter_size(host_count):
+    """Returns the bytes of the bits of a Bloom filter over host_count hosts"""
+    return (host_count * BLOOM_BITS_PER_HOST + 7) // 8 or 1
+
+
+def report_bloom_filter(bin_data):
+    """Prints the size and false positive rate of the Bloom filter in bin_data"""
+    bloom = _read_index(_buffer_reader(bin_data)).bloom
+    if bloom is None:
+        return
+    # Other hosts match when all of their bits happen to be set.
+    filled = bin(int.from_bytes(bloom.bits, "little")).count("1") / bloom.size
+    print(
+        "Bloom filter is %d KiB with %d hash functions, %.2f%% false positives"
+        % (len(bloom.bits) // 1024, bloom.hashes, 100.0 * filled ** bloom.hashes)
+    )
+
+
+def encode_entry(flags, label):
+    if len(label) > 0xFF:
+        raise ValueError("label too long for encoding scheme: %r" % label)
+    return struct.pack("<BB", flags, len(label)) + label
+
+
+ENCODERS = {1: encode_v1, 2: encode_v2, 3: encode_v3}
 
 
 if __name__ == "__main__":
@@ -0,0 +1,187 @@
+"""Classifies hosts read from files or stdin as preloaded or not"""
+
+import argparse
+import collections
+import gc
+import json
+import multiprocessing
+import os
+import sys
+import time
+import typing
+
+import hstspreload
+
+# Size of the blocks of input that are classified at once.
+BLOCK_SIZE = 1024 * 1024
+TSV_RESULTS = (b"\tfalse\n", b"\ttrue\n")
+# The bytes that bytes.split() separates hosts at.
+WHITESPACE = (b" ", b"\t", b"\n", b"\r", b"\x0b", b"\x0c")
+
+
+def main(argv: typing.Optional[typing.List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        prog="python -m hstspreload",
+        description="Reads hosts separated by whitespace from files or stdin and "
+        "writes whether each one is on the HSTS preload list to stdout.",
+    )
+    parser.add_argument(
+        "files",
+        nargs="*",
+        default=["-"],
+        help="files to read hosts from, '-' or no files for stdin",
+    )
+    parser.add_argument(
+        "--format",
+        choices=["tsv", "json"],
+        default="tsv",
+        help="write 'host<TAB>true' lines or JSON objects, one per line",
+    )
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=1,
+        help="number of worker processes to classify hosts in",
+    )
+    parser.add_argument(
+        "--normalize",
+        action="store_true",
+        help="look up hosts as hstspreload.normalize_host() returns them, "
+        "e.g. without uppercase letters, a port or a trailing dot",
+    )
+    parser.add_argument(
+        "--quiet", action="store_true", help="don't write throughput stats to stderr"
+    )
+    args = parser.parse_args(argv)
+    if args.jobs < 1:
+        parser.error("--jobs must be at least 1")
+    for path in args.files:
+        if path != "-":
+            try:
+                open(path, "rb").close()
+            except OSError as e:
+                parser.error("can't open '%s': %s" % (path, e.strerror))
+
+    started = time.perf_counter()
+    hosts = preloaded = size = 0
+    out = sys.stdout.buffer
+    try:
+        for output, block_hosts, block_preloaded, block_size in classify_blocks(
+            iter_blocks(args.files), args.format, args.jobs, args.normalize
+        ):
+            out.write(output)
+            hosts += block_hosts
+            preloaded += block_preloaded
+            size += block_size
+        out.flush()
+    except BrokenPipeError:
+        # The reader stopped early, e.g. 'head'. Python flushes stdout again
+        # at exit, so point it at devnull to exit quietly.
+        os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+        return 0
+
+    if not args.quiet:
+        seconds = max(time.perf_counter() - started, 1e-9)
+        print(
+            "Classified %d hosts (%d preloaded) in %.2fs: %.0f hosts/s, %.1f MB/s"
+            % (hosts, preloaded, seconds, hosts / seconds, size / seconds / 1e6),
+            file=sys.stderr,
+        )
+    return 0
+
+
+def iter_blocks(paths: typing.List[str]) -> typing.Iterator[bytes]:
+    """Yields the input in blocks of about BLOCK_SIZE that end at whitespace"""
+    for path in paths:
+        f = sys.stdin.buffer if path == "-" else open(path, "rb")
+        try:
+            rest = b""
+            while True:
+                block = f.read(BLOCK_SIZE)
+                if not block:
+                    break
+                block = rest + block
+                end = max(block.rfind(space) for space in WHITESPACE) + 1
+                rest = block[end:]
+                if end:
+                    yield block[:end]
+            if rest:
+                yield rest
+        finally:
+            if f is not sys.stdin.buffer:
+                f.close()
+
+
+def classify_blocks(
+    blocks: typing.Iterable[bytes], output_format: str, jobs: int, normalize: bool
+) -> typing.Iterator[typing.Tuple[bytes, int, int, int]]:
+    """Yields the output of every block in order, classifying the blocks in
+    'jobs' processes with at most two blocks in flight per process"""
+    if jobs == 1:
+        hstspreload.load_all()
+        for block in blocks:
+            yield classify_block(block, output_format, normalize)
+        return
+
+    # Forked workers share the list decoded by the parent, other workers
+    # share the pages of the memory-mapped file instead of decoding it.
+    if "fork" in multiprocessing.get_all_start_methods():
+        hstspreload.load_all()
+        if hasattr(gc, "freeze"):
+            # Keep the collector from touching and so copying the list.
+            gc.freeze()
+        pool = multiprocessing.get_context("fork").Pool(jobs)
+    else:
+        pool = multiprocessing.Pool(jobs, initializer=hstspreload.load_resident)
+
+    with pool:
+        in_flight = collections.deque()  # type: typing.Deque[typing.Any]
+        for block in blocks:
+            if len(in_flight) >= 2 * jobs:
+                yield in_flight.popleft().get()
+            in_flight.append(
+                pool.apply_async(classify_block, (block, output_format, normalize))
+            )
+        while in_flight:
+            yield in_flight.popleft().get()
+
+
+def classify_block(
+    block: bytes, output_format: str, normalize: bool = False
+) -> typing.Tuple[bytes, int, int, int]:
+    """Returns the output for the hosts in a block, the number of hosts,
+    the number of preloaded hosts and the size of the block"""
+    hosts = block.split()
+    if normalize:
+        results = hstspreload.in_hsts_preload_many(
+            [normalize_host(host) for host in hosts]
+        )
+    else:
+        results = hstspreload.in_hsts_preload_many(hosts)
+    if output_format == "tsv":
+        output = b"".join(
+            [host + TSV_RESULTS[result] for host, result in zip(hosts, results)]
+        )
+    else:
+        output = "".join(
+            [
+                json.dumps(
+                    {"host": host.decode("ascii", "replace"), "preloaded": result}
+                )
+                + "\n"
+                for host, result in zip(hosts, results)
+            ]
+        ).encode("ascii")
+    return output, len(hosts), sum(results), len(block)
+
+
+def normalize_host(host: bytes) -> bytes:
+    """Returns the normalized host, or the host as is if it can't be encoded"""
+    try:
+        return hstspreload.normalize_host(host)
+    except ValueError:
+        return host
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,576 @@
+"""Parts of hstspreload that most programs never use: stats, URL upgrades,
+Unicode hosts, format version 3 and NumPy lookups. hstspreload imports
+this module the first time one of them is used, to keep them out of its
+own import.
+"""
+
+import functools
+import re
+import typing
+
+from hstspreload._list import (
+    _HAS_CHILDREN,
+    _INCLUDE_SUBDOMAINS,
+    _IS_LEAF,
+    _TRIE_BLOCK,
+    _TRIE_OFFSET,
+    _BloomFilter,
+    _Bucket,
+    _BucketCache,
+    _Index,
+    _iter_entries,
+    _read_sections,
+    _Reader,
+    _SuffixHashIndex,
+)
+
+
+class _Stats:
+    """Counts what lookups do while stats are enabled"""
+
+    def __init__(self, histogram: bool) -> None:
+        self.histogram = histogram
+        self.reset(None)
+
+    def reset(self, bucket_cache: typing.Optional[_BucketCache]) -> None:
+        self.lookups = 0
+        self.host_cache_misses = 0
+        self.gtld_hits = 0
+        self.bloom_rejects = 0
+        self.buckets_read = 0
+        self.bytes_read = 0
+        self.entries_read = 0
+        # The layer located last by the current lookup, -1 for none.
+        self.layer = -1
+        self.exit_layers = [0] * 5
+        # Lookups that took less than 2 ** i microseconds.
+        self.latency = [0] * 32
+        # The bucket cache keeps its own counts, until it's cleared.
+        self.bucket_cache_base = (
+            (bucket_cache, bucket_cache.hits, bucket_cache.misses)
+            if bucket_cache is not None
+            else (None, 0, 0)
+        )
+
+    def carry_over(self, old: _BucketCache, new: _BucketCache) -> None:
+        """Counts the hits and misses of the bucket cache 'new' on top of
+        those so far in 'old', which it replaces"""
+        hits, misses = old.hits, old.misses
+        base_cache, base_hits, base_misses = self.bucket_cache_base
+        if base_cache is old and hits >= base_hits:
+            hits -= base_hits
+            misses -= base_misses
+        self.bucket_cache_base = (new, new.hits - hits, new.misses - misses)
+
+    def snapshot(self, bucket_cache: _BucketCache) -> typing.Dict[str, typing.Any]:
+        bucket_cache_hits, bucket_cache_misses = bucket_cache.hits, bucket_cache.misses
+        base_cache, base_hits, base_misses = self.bucket_cache_base
+        if base_cache is bucket_cache and bucket_cache_hits >= base_hits:
+            bucket_cache_hits -= base_hits
+            bucket_cache_misses -= base_misses
+        snapshot = {
+            "lookups": self.lookups,
+            "host_cache_hits": self.lookups - self.host_cache_misses,
+            "host_cache_misses": self.host_cache_misses,
+            "gtld_hits": self.gtld_hits,
+            "bloom_rejects": self.bloom_rejects,
+            "bucket_cache_hits": bucket_cache_hits,
+            "bucket_cache_misses": bucket_cache_misses,
+            "buckets_read": self.buckets_read,
+            "bytes_read": self.bytes_read,
+            "entries_read": self.entries_read,
+            "exit_layers": list(self.exit_layers),
+        }  # type: typing.Dict[str, typing.Any]
+        if self.histogram:
+            snapshot["latency_us"] = {
+                1 << i: count for i, count in enumerate(self.latency) if count
+            }
+        return snapshot
+
+    def read_bucket(self, data: typing.Any, pos: int, bucket: "_Bucket") -> None:
+        self.buckets_read += 1
+        self.bytes_read += bucket[2]
+        self.entries_read += sum(1 for _ in _iter_entries(data, pos, pos + bucket[2]))
+
+
+class _StatsIndex:
+    """Wraps an index to count the layers located and buckets read"""
+
+    def __init__(self, index: "_Index", stats: _Stats) -> None:
+        self.index = index
+        self.stats = stats
+        self.keyed_by_suffix = index.keyed_by_suffix
+        self.bloom = None if index.bloom is None else _StatsBloom(index.bloom, stats)
+
+    def __getattr__(self, name: str) -> typing.Any:
+        return getattr(self.index, name)
+
+    def locate(self, layer: int, key: bytes) -> typing.Optional["_Bucket"]:
+        self.stats.layer = layer
+        return self.index.locate(layer, key)
+
+    def walk(
+        self, host: bytes, lowered: bytes, labels: typing.List[bytes], read: "_Reader"
+    ) -> bool:
+        return self.index.walk(host, lowered, labels, read, self.stats)
+
+    def scan(
+        self,
+        data: typing.Any,
+        pos: int,
+        bucket: "_Bucket",
+        key: bytes,
+        suffix: bytes,
+        is_host: bool,
+    ) -> int:
+        self.stats.read_bucket(data, pos, bucket)
+        return self.index.scan(data, pos, bucket, key, suffix, is_host)
+
+    def decode(
+        self, data: typing.Any, pos: int, bucket: "_Bucket"
+    ) -> typing.Dict[bytes, int]:
+        self.stats.read_bucket(data, pos, bucket)
+        return self.index.decode(data, pos, bucket)
+
+
+class _StatsBloom:
+    """Wraps a Bloom filter to count the hosts it rejects"""
+
+    def __init__(self, bloom: "_BloomFilter", stats: _Stats) -> None:
+        self.bloom = bloom
+        self.stats = stats
+
+    def may_match(self, host: bytes) -> bool:
+        if self.bloom.may_match(host):
+            return True
+        self.stats.bloom_rejects += 1
+        return False
+
+
+def _unwrap_index(index: typing.Any) -> "_Index":
+    return index.index if isinstance(index, _StatsIndex) else index
+
+
+# Matches the authority of an 'http://' URL, capturing the host without any
+# trailing dot and the port. Hosts in brackets are IP addresses.
+_HTTP_URL_PATTERN = r"http://(?:[^/?#]*@)?([^/?#:@\[\]]*?)\.?(?::(\d*))?(?=[/?#]|\Z)"
+
+
+@functools.lru_cache(maxsize=None)
+def _upgrade_patterns() -> typing.Tuple[typing.Any, typing.Any]:
+    """Returns the compiled pattern, scheme and ports for str and bytes URLs,
+    compiled on the first upgrade_urls() call to keep them out of the import.
+    """
+    return (
+        (re.compile(_HTTP_URL_PATTERN, re.IGNORECASE), "https://", "80", "443"),
+        (
+            re.compile(_HTTP_URL_PATTERN.encode("ascii"), re.IGNORECASE),
+            b"https://",
+            b"80",
+            b"443",
+        ),
+    )
+
+
+def _normalize_unicode_host(host: str) -> bytes:
+    """Same as normalize_host() for a host with Unicode labels"""
+    host = host.strip(" \t").rpartition("@")[2].partition(":")[0]
+    if host.endswith("."):
+        host = host[:-1]
+    return _idna_encode(host.lower())
+
+
+@functools.lru_cache(maxsize=1024)
+def _idna_encode(name: str) -> bytes:
+    """IDNA-encodes a lowercase host name that has Unicode labels"""
+    try:
+        import idna
+    except ImportError:
+        idna = None
+    if idna is not None:
+        try:
+            return idna.encode(name, uts46=True)
+        except idna.IDNAError:
+            # IDNA 2003 still allows some names on the list, e.g. emoji.
+            pass
+    return name.encode("idna").lower()
+
+
+class _TrieIndex:
+    """Format version 3: the labels of the preloaded hosts form a trie from
+    the TLD down, in which identical sub-tries are stored only once. Lookups
+    walk it label by label and only read the nodes they visit.
+
+    The header is followed by a table of sections: 'TRIE' starts with the
+    offset of the root node, followed by the nodes, and 'GTLD' holds the
+    gTLDs that preload all of their sub-domains like version 2. A node is the
+    number of its blocks, the offset of every block and of the end of the
+    node and up to 16 records sorted by label per block. A record is encoded
+    like an entry, followed by the offset of its child node if it has one.
+    Offsets are little-endian uint32s relative to the start of 'TRIE'.
+    """
+
+    keyed_by_suffix = False
+    walks_labels = True
+    bloom = None
+
+    def __init__(
+        self,
+        base: int,
+        root: int,
+        root_data: bytes,
+        gtld_include_subdomains: typing.Optional[typing.FrozenSet[bytes]] = None,
+    ) -> None:
+        self.base = base
+        self.root = root
+        # The root is visited by every lookup, so it's kept in memory.
+        start = base + root
+
+        def read_root(offset: int, size: int) -> typing.Tuple[bytes, int]:
+            return root_data, offset - start
+
+        self.read_root = read_root
+        self.gtld_include_subdomains = gtld_include_subdomains
+
+    @classmethod
+    def load(cls, read: _Reader) -> "_TrieIndex":
+        sections = _read_sections(read)
+        gtld_include_subdomains = None
+        if b"GTLD" in sections:
+            offset, size = sections[b"GTLD"]
+            data, pos = read(offset, size)
+            gtld_include_subdomains = frozenset(
+                label for _, label in _iter_entries(data, pos, pos + size)
+            )
+        base, _ = sections[b"TRIE"]
+        data, pos = read(base, _TRIE_OFFSET.size)
+        (root,) = _TRIE_OFFSET.unpack_from(data, pos)
+        data, pos = read(base + root, _TRIE_OFFSET.size)
+        (blocks,) = _TRIE_OFFSET.unpack_from(data, pos)
+        data, pos = read(base + root + _TRIE_OFFSET.size * (blocks + 1), 4)
+        (size,) = _TRIE_OFFSET.unpack_from(data, pos)
+        data, pos = read(base + root, size)
+        return cls(base, root, bytes(data[pos : pos + size]), gtld_include_subdomains)
+
+    def walk(
+        self,
+        host: bytes,
+        lowered: bytes,
+        labels: typing.List[bytes],
+        read: _Reader,
+        stats: typing.Optional["_Stats"] = None,
+    ) -> bool:
+        """Same as _LoadedList.walk() for the reversed labels of a host"""
+        node = self.root
+        read_node = self.read_root
+        # Start of the part of the host visited so far.
+        start = len(host) + 1
+        for layer, label in enumerate(labels):
+            # None of our layers are greater than 5 deep.
+            if layer > 4:
+                return False
+
+            start -= len(label) + 1
+            if stats is not None:
+                stats.layer = layer
+            flags, child = self.find(read_node, node, label, stats)
+            # Leaves only match hosts that are already lowercase.
+            if (
+                flags & _IS_LEAF
+                and (start == 0 or flags & _INCLUDE_SUBDOMAINS)
+                and host[start:] == lowered[start:]
+            ):
+                return True
+            if not flags & _HAS_CHILDREN:
+                return False
+            node = child
+            read_node = read
+        return False
+
+    def find(
+        self,
+        read: _Reader,
+        node: int,
+        label: bytes,
+        stats: typing.Optional["_Stats"] = None,
+    ) -> typing.Tuple[int, int]:
+        """Returns the flags and child node of the record for 'label' in a
+        node, reading only the blocks that bisecting the node visits"""
+        offset = self.base + node
+        data, pos = read(offset, _TRIE_OFFSET.size)
+        (blocks,) = _TRIE_OFFSET.unpack_from(data, pos)
+        table, table_pos = read(
+            offset + _TRIE_OFFSET.size, _TRIE_OFFSET.size * (blocks + 1)
+        )
+        if stats is not None:
+            stats.buckets_read += 1
+            stats.bytes_read += _TRIE_OFFSET.size * (blocks + 2)
+
+        # Find the last block that starts with a label before or at 'label'.
+        lo = 0
+        hi = blocks
+        while lo < hi:
+            mid = (lo + hi) // 2
+            first, end = _TRIE_BLOCK.unpack_from(table, table_pos + 4 * mid)
+            data, pos = read(offset + first, end - first)
+            if data[pos + 2 : pos + 2 + data[pos + 1]] <= label:
+                lo = mid + 1
+            else:
+                hi = mid
+            if stats is not None:
+                stats.bytes_read += end - first
+                stats.entries_read += 1
+        if lo == 0:
+            return 0, 0
+
+        first, end = _TRIE_BLOCK.unpack_from(table, table_pos + 4 * (lo - 1))
+        data, pos = read(offset + first, end - first)
+        end += pos - first
+        while pos < end:
+            flags = data[pos]
+            size = data[pos + 1]
+            pos += 2
+            record = data[pos : pos + size]
+            pos += size
+            if stats is not None:
+                stats.entries_read += 1
+            if record == label:
+                if flags & _HAS_CHILDREN:
+                    return flags, _TRIE_OFFSET.unpack_from(data, pos)[0]
+                return flags, 0
+            if record > label:
+                break
+            if flags & _HAS_CHILDREN:
+                pos += _TRIE_OFFSET.size
+        return 0, 0
+
+    def iter_leaves(self, read: _Reader) -> typing.Iterator[typing.Tuple[bytes, int]]:
+        """Yields the host and flags of every leaf in the list"""
+        # Nodes still to visit as (offset, the suffix they continue).
+        pending = [(self.root, b"")]
+        while pending:
+            node, suffix = pending.pop()
+            offset = self.base + node
+            data, pos = read(offset, _TRIE_OFFSET.size)
+            (blocks,) = _TRIE_OFFSET.unpack_from(data, pos)
+            data, pos = read(offset + _TRIE_OFFSET.size * (blocks + 1), 4)
+            (size,) = _TRIE_OFFSET.unpack_from(data, pos)
+            data, pos = read(offset, size)
+            end = pos + size
+            pos += _TRIE_OFFSET.size * (blocks + 2)
+            while pos < end:
+                flags = data[pos]
+                size = data[pos + 1]
+                label = bytes(data[pos + 2 : pos + 2 + size])
+                pos += 2 + size
+                name = label + b"." + suffix if suffix else label
+                if flags & _IS_LEAF:
+                    yield name, flags & (_IS_LEAF | _INCLUDE_SUBDOMAINS)
+                if flags & _HAS_CHILDREN:
+                    (child,) = _TRIE_OFFSET.unpack_from(data, pos)
+                    pending.append((child, name))
+                    pos += _TRIE_OFFSET.size
+
+
+class _PackedLookup:
+    """Looks up columns of hosts in a list in format version 2 with NumPy.
+
+    Lookups visit the same layers as _LoadedList.walk(), for all hosts still
+    being resolved at once. The crc32 of the lowercase suffix of every host
+    in a layer is computed byte by byte across the hosts. Entries with the
+    same crc32 are then found in the entries of the list sorted by theirs,
+    and compared byte by byte.
+    """
+
+    def __init__(
+        self,
+        np: typing.Any,
+        index: _SuffixHashIndex,
+        data: typing.Any,
+        gtld_include_subdomains: typing.AbstractSet[bytes],
+    ) -> None:
+        self.np = np
+        crc_table = np.arange(256, dtype=np.uint32)
+        for _ in range(8):
+            crc_table = np.where(
+                crc_table & 1, (crc_table >> 1) ^ 0xEDB88320, crc_table >> 1
+            ).astype(np.uint32)
+        self.crc_table = crc_table
+        lower_table = np.arange(256, dtype=np.uint8)
+        lower_table[ord("A") : ord("Z") + 1] += ord("a") - ord("A")
+        self.lower_table = lower_table
+
+        # Keeps the list mapped for as long as its entries are used.
+        self.data = np.frombuffer(data, dtype=np.uint8)
+        offsets = np.frombuffer(index.offsets, dtype=np.uint32)[:-1].astype(np.int64)
+        self.entries = self.sorted_by_crc(
+            self.data, offsets + 2, self.data[offsets + 1], self.data[offsets]
+        )
+        names = sorted(gtld_include_subdomains)
+        gtlds = np.frombuffer(b"".join(names) or b"\0", dtype=np.uint8)
+        lengths = np.array([len(name) for name in names], dtype=np.int64)
+        self.gtlds = self.sorted_by_crc(
+            gtlds,
+            np.cumsum(lengths) - lengths,
+            lengths,
+            np.full(len(names), _IS_LEAF, dtype=np.uint8),
+        )
+
+    def sorted_by_crc(
+        self,
+        data: typing.Any,
+        starts: typing.Any,
+        lengths: typing.Any,
+        flags: typing.Any,
+    ) -> typing.Tuple[typing.Any, ...]:
+        """Returns the crc32s of the strings in 'data' at 'starts' with
+        'lengths' sorted, the strings and their flags in the same order
+        and how many of them share a crc32 at most"""
+        np = self.np
+        lengths = lengths.astype(np.int64)
+        crcs = self.crc32(data, starts, lengths)
+        order = np.argsort(crcs, kind="stable")
+        crcs = crcs[order]
+        collisions = 1
+        if len(crcs):
+            runs = np.flatnonzero(np.diff(crcs) != 0)
+            collisions = int(np.diff(runs, prepend=-1, append=len(crcs) - 1).max())
+        return data, crcs, starts[order], lengths[order], flags[order], collisions
+
+    def crc32(
+        self, data: typing.Any, starts: typing.Any, lengths: typing.Any
+    ) -> typing.Any:
+        """Returns zlib.crc32() of the strings in 'data' at 'starts' with
+        'lengths', a byte of every string that long at a time"""
+        np = self.np
+        # Longest first, the strings that still have a byte are a prefix.
+        order = np.argsort(-lengths, kind="stable")
+        starts = starts[order]
+        negative_lengths = -lengths[order]
+        crcs = np.full(len(order), 0xFFFFFFFF, dtype=np.uint32)
+        crc_table = self.crc_table
+        for i in range(-int(negative_lengths[0]) if len(order) else 0):
+            count = np.searchsorted(negative_lengths, -i)
+            crc = crcs[:count]
+            crcs[:count] = crc_table[(crc ^ data[starts[:count] + i]) & 0xFF] ^ (
+                crc >> 8
+            )
+        result = np.empty_like(crcs)
+        result[order] = crcs ^ 0xFFFFFFFF
+        return result
+
+    def equal(
+        self,
+        data: typing.Any,
+        starts: typing.Any,
+        other: typing.Any,
+        other_starts: typing.Any,
+        lengths: typing.Any,
+    ) -> typing.Any:
+        """Returns which strings of 'lengths' in 'data' at 'starts' are
+        equal to those in 'other' at 'other_starts'"""
+        np = self.np
+        order = np.argsort(-lengths, kind="stable")
+        starts = starts[order]
+        other_starts = other_starts[order]
+        negative_lengths = -lengths[order]
+        equal = np.ones(len(order), dtype=bool)
+        for i in range(-int(negative_lengths[0]) if len(order) else 0):
+            count = np.searchsorted(negative_lengths, -i)
+            equal[:count] &= data[starts[:count] + i] == other[other_starts[:count] + i]
+        result = np.empty_like(equal)
+        result[order] = equal
+        return result
+
+    def find(
+        self,
+        table: typing.Tuple[typing.Any, ...],
+        data: typing.Any,
+        starts: typing.Any,
+        lengths: typing.Any,
+    ) -> typing.Any:
+        """Returns the flags of the strings in 'data' at 'starts' with
+        'lengths' in a table of sorted_by_crc(), 0 for those not in it"""
+        np = self.np
+        table_data, crcs, table_starts, table_lengths, table_flags, collisions = table
+        flags = np.zeros(len(starts), dtype=np.uint8)
+        if not len(crcs):
+            return flags
+        query_crcs = self.crc32(data, starts, lengths)
+        first = np.searchsorted(crcs, query_crcs)
+        for i in range(collisions):
+            position = np.minimum(first + i, len(crcs) - 1)
+            same_crc = (first + i < len(crcs)) & (crcs[position] == query_crcs)
+            # Entries with the same crc32 are next to each other, those with
+            # another length or bytes don't end the search for the others.
+            if not same_crc.any():
+                break
+            candidates = np.flatnonzero(
+                same_crc & (table_lengths[position] == lengths) & (flags == 0)
+            )
+            if not len(candidates):
+                continue
+            position = position[candidates]
+            equal = self.equal(
+                data,
+                starts[candidates],
+                table_data,
+                table_starts[position],
+                lengths[candidates],
+            )
+            flags[candidates[equal]] = table_flags[position[equal]]
+        return flags
+
+    def lookup(self, data: typing.Any, offsets: typing.Any) -> typing.Any:
+        """Same as in_hsts_preload_packed() with NumPy"""
+        np = self.np
+        raw = np.frombuffer(data, dtype=np.uint8)
+        lowered = self.lower_table[raw]
+        offsets = np.asarray(offsets, dtype=np.int64)
+        starts = offsets[:-1]
+        ends = offsets[1:]
+        results = np.zeros(len(starts), dtype=bool)
+
+        # The dots in every host are dots[first_dots:end_dots].
+        dots = np.flatnonzero(lowered == ord("."))
+        first_dots = np.searchsorted(dots, starts)
+        end_dots = np.searchsorted(dots, ends)
+        dots = np.append(dots, 0)
+
+        # Fast-branch for gTLDs that are registered to preload all sub-domains.
+        label_starts = np.where(end_dots > first_dots, dots[end_dots - 1] + 1, starts)
+        results[
+            self.find(self.gtlds, lowered, label_starts, ends - label_starts) != 0
+        ] = True
+
+        # The hosts still being resolved, as indices into the column.
+        pending = np.flatnonzero(~results)
+        # None of our layers are greater than 5 deep.
+        for layer in range(5):
+            last_dot = end_dots[pending] - 1 - layer
+            has_dot = last_dot >= first_dots[pending]
+            suffix_starts = np.where(
+                has_dot, dots[np.maximum(last_dot, 0)] + 1, starts[pending]
+            )
+            suffix_ends = ends[pending]
+            flags = self.find(
+                self.entries, lowered, suffix_starts, suffix_ends - suffix_starts
+            )
+
+            is_leaf = (flags & _IS_LEAF != 0) & (
+                (suffix_starts == starts[pending]) | (flags & _INCLUDE_SUBDOMAINS != 0)
+            )
+            # Leaves only match hosts whose suffix is already lowercase.
+            leaves = np.flatnonzero(is_leaf)
+            is_leaf[leaves] = self.equal(
+                raw,
+                suffix_starts[leaves],
+                lowered,
+                suffix_starts[leaves],
+                suffix_ends[leaves] - suffix_starts[leaves],
+            )
+            results[pending[is_leaf]] = True
+            pending = pending[~is_leaf & (flags & _HAS_CHILDREN != 0) & has_dot]
+            if not len(pending):
+                break
+        return results
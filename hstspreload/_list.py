@@ -0,0 +1,1284 @@
+"""The lookups of hstspreload, imported the first time the module looks up
+a host or HSTSPreloadList is used"""
+
+import array
+import collections
+import functools
+import itertools
+import os
+import struct
+import sys
+import threading
+import time
+import typing
+import weakref
+import zlib
+
+try:
+    import mmap
+except ImportError:  # Platforms without mmap, e.g. WASI and Emscripten
+    mmap = None  # type: ignore
+
+import hstspreload
+from hstspreload import _GTLD_INCLUDE_SUBDOMAINS, normalize_host
+
+if typing.TYPE_CHECKING:
+    from hstspreload._extras import _PackedLookup, _Stats, _TrieIndex  # noqa: F401
+
+# fmt: off
+_CRC8_TABLE = [
+    0x00, 0x07, 0x0e, 0x09, 0x1c, 0x1b, 0x12, 0x15,
+    0x38, 0x3f, 0x36, 0x31, 0x24, 0x23, 0x2a, 0x2d,
+    0x70, 0x77, 0x7e, 0x79, 0x6c, 0x6b, 0x62, 0x65,
+    0x48, 0x4f, 0x46, 0x41, 0x54, 0x53, 0x5a, 0x5d,
+    0xe0, 0xe7, 0xee, 0xe9, 0xfc, 0xfb, 0xf2, 0xf5,
+    0xd8, 0xdf, 0xd6, 0xd1, 0xc4, 0xc3, 0xca, 0xcd,
+    0x90, 0x97, 0x9e, 0x99, 0x8c, 0x8b, 0x82, 0x85,
+    0xa8, 0xaf, 0xa6, 0xa1, 0xb4, 0xb3, 0xba, 0xbd,
+    0xc7, 0xc0, 0xc9, 0xce, 0xdb, 0xdc, 0xd5, 0xd2,
+    0xff, 0xf8, 0xf1, 0xf6, 0xe3, 0xe4, 0xed, 0xea,
+    0xb7, 0xb0, 0xb9, 0xbe, 0xab, 0xac, 0xa5, 0xa2,
+    0x8f, 0x88, 0x81, 0x86, 0x93, 0x94, 0x9d, 0x9a,
+    0x27, 0x20, 0x29, 0x2e, 0x3b, 0x3c, 0x35, 0x32,
+    0x1f, 0x18, 0x11, 0x16, 0x03, 0x04, 0x0d, 0x0a,
+    0x57, 0x50, 0x59, 0x5e, 0x4b, 0x4c, 0x45, 0x42,
+    0x6f, 0x68, 0x61, 0x66, 0x73, 0x74, 0x7d, 0x7a,
+    0x89, 0x8e, 0x87, 0x80, 0x95, 0x92, 0x9b, 0x9c,
+    0xb1, 0xb6, 0xbf, 0xb8, 0xad, 0xaa, 0xa3, 0xa4,
+    0xf9, 0xfe, 0xf7, 0xf0, 0xe5, 0xe2, 0xeb, 0xec,
+    0xc1, 0xc6, 0xcf, 0xc8, 0xdd, 0xda, 0xd3, 0xd4,
+    0x69, 0x6e, 0x67, 0x60, 0x75, 0x72, 0x7b, 0x7c,
+    0x51, 0x56, 0x5f, 0x58, 0x4d, 0x4a, 0x43, 0x44,
+    0x19, 0x1e, 0x17, 0x10, 0x05, 0x02, 0x0b, 0x0c,
+    0x21, 0x26, 0x2f, 0x28, 0x3d, 0x3a, 0x33, 0x34,
+    0x4e, 0x49, 0x40, 0x47, 0x52, 0x55, 0x5c, 0x5b,
+    0x76, 0x71, 0x78, 0x7f, 0x6a, 0x6d, 0x64, 0x63,
+    0x3e, 0x39, 0x30, 0x37, 0x22, 0x25, 0x2c, 0x2b,
+    0x06, 0x01, 0x08, 0x0f, 0x1a, 0x1d, 0x14, 0x13,
+    0xae, 0xa9, 0xa0, 0xa7, 0xb2, 0xb5, 0xbc, 0xbb,
+    0x96, 0x91, 0x98, 0x9f, 0x8a, 0x8d, 0x84, 0x83,
+    0xde, 0xd9, 0xd0, 0xd7, 0xc2, 0xc5, 0xcc, 0xcb,
+    0xe6, 0xe1, 0xe8, 0xef, 0xfa, 0xfd, 0xf4, 0xf3
+]
+# fmt: on
+
+_IS_LEAF = 0x80
+_INCLUDE_SUBDOMAINS = 0x40
+# The entry continues into the next layer. Version 1 of the format
+# only sets this in decoded buckets.
+_HAS_CHILDREN = 0x01
+
+# 'hstspreload.bin' starts with a header holding the version of its format,
+# see _Crc8Index, _SuffixHashIndex and _TrieIndex for the rest of the file.
+_MAGIC = b"HSTS"
+_HEADER = struct.Struct("<4sH")
+_JUMP_INFO = struct.Struct("<II")
+_SECTION_COUNT = struct.Struct("<H")
+_SECTION = struct.Struct("<4sII")
+_UINT32 = "I" if array.array("I").itemsize == 4 else "L"
+_TRIE_OFFSET = struct.Struct("<I")
+_TRIE_BLOCK = struct.Struct("<II")
+
+
+try:
+    from importlib.resources import open_binary
+
+    def open_pkg_binary(path: str) -> typing.BinaryIO:
+        return open_binary("hstspreload", path)
+
+
+except ImportError:
+
+    def open_pkg_binary(path: str) -> typing.BinaryIO:
+        return open(
+            os.path.join(os.path.dirname(os.path.abspath(__file__)), path),
+            "rb",
+        )
+
+
+def _open_list(path: typing.Optional[str]) -> typing.BinaryIO:
+    if path is None:
+        return open_pkg_binary("hstspreload.bin")
+    return open(path, "rb")
+
+
+def _map_list(path: typing.Optional[str]) -> typing.Union[bytes, "mmap.mmap"]:
+    with _open_list(path) as f:
+        try:
+            fileno = f.fileno()
+        except (AttributeError, OSError):
+            # Resources inside a zip archive don't have a file descriptor.
+            fileno = None
+        if mmap is None or fileno is None:
+            return f.read()
+        # The mapping stays valid after the file object is closed.
+        return mmap.mmap(fileno, 0, access=mmap.ACCESS_READ)
+
+
+def _file_id(f: typing.BinaryIO) -> typing.Optional[typing.Tuple[int, ...]]:
+    """Returns what identifies the version of an open list file, None for
+    resources inside a zip archive"""
+    try:
+        stat = os.fstat(f.fileno())
+    except (AttributeError, OSError):
+        return None
+    return stat.st_dev, stat.st_ino, stat.st_size, stat.st_mtime_ns
+
+
+CacheInfo = collections.namedtuple(
+    "CacheInfo", ["hits", "misses", "maxsize", "currsize"]
+)
+LoadInfo = collections.namedtuple("LoadInfo", ["hosts", "seconds", "size"])
+
+
+class HSTSPreloadList:
+    """An HSTS preload list in the format of 'hstspreload.bin' with its own
+    caches, the functions of this module use the list bundled with it.
+
+    'path' defaults to the bundled list, which lookups that miss the caches
+    read from the package until load_resident() is called. A list at any
+    other path is memory-mapped right away and keeps answering from the
+    same data until reload() is called, so replace the file by renaming a
+    new one over it rather than writing to it in place.
+    """
+
+    def __init__(self, path: typing.Optional[str] = None) -> None:
+        self.path = path
+        # Serializes changes to the list, lookups never wait for it.
+        self._lock = threading.Lock()
+        if path is None:
+            self._loaded = _LoadedList(None, None)
+        else:
+            self._loaded = _LoadedList(path, _map_list(path))
+            self._loaded.load_index()
+        _lists.add(self)
+
+    def in_hsts_preload(self, host: typing.AnyStr) -> bool:
+        """Same as in_hsts_preload() for this list"""
+        return self._loaded.cached_lookup(host)
+
+    def in_hsts_preload_host(self, host: typing.AnyStr) -> bool:
+        """Same as in_hsts_preload_host() for this list"""
+        try:
+            host = normalize_host(host)
+        except ValueError:
+            return False
+        # Cached by the normalized host, shared with in_hsts_preload().
+        return self._loaded.cached_lookup(host)
+
+    def in_hsts_preload_many(
+        self, hosts: typing.Iterable[typing.AnyStr]
+    ) -> typing.List[bool]:
+        """Same as in_hsts_preload_many() for this list"""
+        return self._loaded.lookup_many(hosts)
+
+    def in_hsts_preload_packed(
+        self, data: typing.Any, offsets: typing.Any
+    ) -> typing.Any:
+        """Same as in_hsts_preload_packed() for this list"""
+        loaded = self._loaded
+        try:
+            packed = loaded.get_packed_lookup()
+        except ImportError:
+            packed = None
+        if packed is None:
+            return loaded.lookup_many(
+                [
+                    bytes(data[offsets[i] : offsets[i + 1]])
+                    for i in range(len(offsets) - 1)
+                ]
+            )
+        return packed.lookup(data, offsets)
+
+    def in_hsts_preload_iter(
+        self, hosts: typing.Iterable[typing.AnyStr], batch_size: int = 4096
+    ) -> typing.Iterator[bool]:
+        """Same as in_hsts_preload_iter() for this list"""
+        if batch_size < 1:
+            raise ValueError("batch_size must be at least 1")
+        hosts = iter(hosts)
+        while True:
+            batch = list(itertools.islice(hosts, batch_size))
+            if not batch:
+                return
+            yield from self.in_hsts_preload_many(batch)
+
+    async def aclassify(
+        self,
+        hosts: typing.AsyncIterable[typing.AnyStr],
+        batch_size: int = 1024,
+        max_in_flight: int = 4,
+    ) -> typing.AsyncIterator[typing.Tuple[typing.AnyStr, bool]]:
+        """Same as aclassify() for this list"""
+        # Only needed here, importing it takes longer than importing this module.
+        import asyncio
+
+        if batch_size < 1 or max_in_flight < 1:
+            raise ValueError("batch_size and max_in_flight must be at least 1")
+        loop = asyncio.get_event_loop()
+        # (hosts, future of their results) for every batch in order.
+        in_flight = collections.deque()  # type: typing.Deque[typing.Any]
+
+        async def submit(batch: typing.List[typing.AnyStr]) -> None:
+            loaded = self._loaded
+            if loaded.data is None and loaded.eager is None:
+                # Lookups would open the file, keep them off the event loop.
+                future = loop.run_in_executor(None, loaded.lookup_many, batch)
+            else:
+                future = loop.create_future()
+                future.set_result(loaded.lookup_many(batch))
+                # Let other tasks run between batches.
+                await asyncio.sleep(0)
+            in_flight.append((batch, future))
+
+        try:
+            batch = []  # type: typing.List[typing.AnyStr]
+            async for host in hosts:
+                batch.append(host)
+                if len(batch) < batch_size:
+                    continue
+                await submit(batch)
+                batch = []
+                # Yield what's resolved and wait for the oldest batch when
+                # too many are in flight, before reading any more hosts.
+                while in_flight and (
+                    len(in_flight) >= max_in_flight or in_flight[0][1].done()
+                ):
+                    batch_hosts, future = in_flight.popleft()
+                    for item in zip(batch_hosts, await future):
+                        yield item
+            if batch:
+                await submit(batch)
+            while in_flight:
+                batch_hosts, future = in_flight.popleft()
+                for item in zip(batch_hosts, await future):
+                    yield item
+        finally:
+            for _, future in in_flight:
+                future.cancel()
+
+    def upgrade_urls(
+        self, urls: typing.Iterable[typing.AnyStr]
+    ) -> typing.Iterator[typing.AnyStr]:
+        """Same as upgrade_urls() for this list"""
+        from hstspreload._extras import _upgrade_patterns
+
+        upgrade_str, upgrade_bytes = _upgrade_patterns()
+        for url in urls:
+            pattern, https, http_port, https_port = (
+                upgrade_str if isinstance(url, str) else upgrade_bytes
+            )
+            match = pattern.match(url)
+            if match is not None:
+                # Hosts are case-insensitive and may have Unicode labels.
+                if self.in_hsts_preload_host(match.group(1)):
+                    if match.group(2) == http_port:
+                        url = (
+                            https
+                            + url[7 : match.start(2)]
+                            + https_port
+                            + url[match.end(2) :]
+                        )
+                    else:
+                        url = https + url[7:]
+            yield url
+
+    def load_resident(self) -> None:
+        """Same as load_resident() for this list"""
+        with self._lock:
+            loaded = self._loaded
+            if loaded.data is None:
+                loaded.data = _map_list(self.path)
+            loaded.bucket_cache.resize(0)
+
+    def load_all(self) -> LoadInfo:
+        """Same as load_all() for this list"""
+        with self._lock:
+            return self._loaded.load_all()
+
+    def load_concurrent(self) -> None:
+        """Same as load_concurrent() for this list"""
+        with self._lock:
+            loaded = self._loaded
+            if loaded.data is None:
+                loaded.data = _map_list(self.path)
+            loaded.load_index()
+            loaded.bucket_cache.resize(0)
+            loaded.set_per_thread(True)
+            self._publish()
+
+    def reload(self) -> bool:
+        """Reads the list from its path again and swaps it in if its checksum
+        changed, returning whether it did. The new list is loaded while
+        lookups carry on with the old one, they are never blocked.
+        """
+        # Only needed here, importing it takes longer than importing this module.
+        import hashlib
+
+        with self._lock:
+            old = self._loaded
+            if old.data is None:
+                # Note which file the old list reads before it's replaced.
+                old.load_index()
+            data = _map_list(self.path)
+            checksum = hashlib.sha256(data).hexdigest()
+            if old.checksum is None:
+                if old.data is not None:
+                    old.checksum = hashlib.sha256(old.data).hexdigest()
+                elif old.file_id is not None:
+                    with _open_list(self.path) as f:
+                        if _file_id(f) == old.file_id:
+                            # Still the file the old list was loaded from.
+                            old.checksum = checksum
+            if checksum == old.checksum:
+                return False
+
+            # Raises ValueError for a file that isn't a list, keeping the old one.
+            loaded = _LoadedList(self.path, data, checksum)
+            loaded.load_index()
+            loaded.set_per_thread(old.per_thread)
+            loaded.bucket_cache.resize(old.bucket_cache.maxsize)
+            # The counts so far carry over to the new list.
+            loaded.set_stats(old.stats, reset=False)
+            if old.stats is not None:
+                old.stats.carry_over(old.bucket_cache, loaded.bucket_cache)
+            loaded.set_host_cache(old.host_cache.cache_info().maxsize)
+            if old.eager is not None:
+                loaded.load_all()
+            if old.data is None:
+                # Keep reading the file on cache misses like before.
+                loaded.data = None
+            self._loaded = loaded
+            self._publish()
+            return True
+
+    def set_cache_sizes(
+        self,
+        hosts: typing.Optional[int] = None,
+        bucket_bytes: typing.Optional[int] = None,
+    ) -> None:
+        """Same as set_cache_sizes() for this list"""
+        with self._lock:
+            loaded = self._loaded
+            if hosts is not None:
+                loaded.set_host_cache(hosts)
+                self._publish()
+            if bucket_bytes is not None:
+                loaded.bucket_cache.resize(bucket_bytes)
+
+    def cache_info(self) -> typing.Dict[str, CacheInfo]:
+        """Same as cache_info() for this list"""
+        loaded = self._loaded
+        return {
+            "hosts": loaded.host_cache.cache_info(),
+            "buckets": loaded.bucket_cache.info(),
+        }
+
+    def cache_clear(self) -> None:
+        """Same as cache_clear() for this list"""
+        loaded = self._loaded
+        loaded.host_cache.cache_clear()
+        loaded.bucket_cache.clear()
+
+    def enable_stats(self, histogram: bool = False) -> None:
+        """Same as enable_stats() for this list"""
+        from hstspreload._extras import _Stats
+
+        with self._lock:
+            self._loaded.set_stats(_Stats(histogram))
+            self._publish()
+
+    def disable_stats(self) -> None:
+        """Same as disable_stats() for this list"""
+        with self._lock:
+            self._loaded.set_stats(None)
+            self._publish()
+
+    def stats(self) -> typing.Dict[str, typing.Any]:
+        """Same as stats() for this list"""
+        loaded = self._loaded
+        if loaded.stats is None:
+            raise RuntimeError("stats aren't enabled, call enable_stats() first")
+        return loaded.stats.snapshot(loaded.bucket_cache)
+
+    def reset_stats(self) -> None:
+        """Same as reset_stats() for this list"""
+        loaded = self._loaded
+        if loaded.stats is not None:
+            loaded.stats.reset(loaded.bucket_cache)
+
+    def _publish(self) -> None:
+        # The module's in_hsts_preload() calls the cached lookup of the
+        # default list without looking it up in the list on every call.
+        if self is hstspreload._default:
+            hstspreload._cached_lookup = self._loaded.cached_lookup
+
+
+# Every list, to reset their locks in forked child processes.
+_lists = weakref.WeakSet()  # type: typing.MutableSet[HSTSPreloadList]
+
+
+def _reset_locks() -> None:
+    # A lock held by another thread while forking is never released
+    # in the child, the mapping itself is inherited and stays valid.
+    for preload_list in list(_lists):
+        preload_list._lock = threading.Lock()
+        loaded = preload_list._loaded
+        loaded.bucket_cache._lock = threading.Lock()
+        if isinstance(loaded.host_cache, _PerThreadCache):
+            loaded.host_cache._lock = threading.Lock()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_locks)
+
+
+class _BucketCache:
+    """LRU cache of decoded buckets bounded by their approximate size in bytes"""
+
+    def __init__(self, maxsize: int) -> None:
+        self.maxsize = maxsize
+        self.currsize = 0
+        self.hits = 0
+        self.misses = 0
+        # (layer, checksum) -> (entries, size)
+        self._buckets = collections.OrderedDict()  # type: collections.OrderedDict
+        self._lock = threading.Lock()
+
+    def get(
+        self, key: typing.Tuple[int, int]
+    ) -> typing.Optional[typing.Dict[bytes, int]]:
+        with self._lock:
+            item = self._buckets.get(key)
+            if item is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._buckets.move_to_end(key)
+            return item[0]
+
+    def put(self, key: typing.Tuple[int, int], entries: typing.Dict[bytes, int]):
+        size = sys.getsizeof(entries) + sum(map(sys.getsizeof, entries))
+        with self._lock:
+            if key in self._buckets or size > self.maxsize:
+                return
+            self._buckets[key] = (entries, size)
+            self.currsize += size
+            self._evict()
+
+    def resize(self, maxsize: int) -> None:
+        with self._lock:
+            self.maxsize = maxsize
+            self._evict()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._buckets.clear()
+            self.currsize = self.hits = self.misses = 0
+
+    def info(self) -> CacheInfo:
+        with self._lock:
+            return CacheInfo(self.hits, self.misses, self.maxsize, self.currsize)
+
+    def _evict(self) -> None:
+        while self.currsize > self.maxsize:
+            _, (_, size) = self._buckets.popitem(last=False)
+            self.currsize -= size
+
+
+class _PerThreadCache:
+    """Caches the results of a function with a functools.lru_cache() for
+    every thread, and has the same methods as one for all of them together
+    """
+
+    def __init__(self, func: typing.Callable[[typing.Any], bool], maxsize: int):
+        self._func = func
+        self._maxsize = maxsize
+        self._local = threading.local()
+        # The caches of threads that are still running.
+        self._caches = weakref.WeakSet()  # type: typing.MutableSet[typing.Any]
+        self._lock = threading.Lock()
+
+    def __call__(self, host: typing.AnyStr) -> bool:
+        try:
+            cache = self._local.cache
+        except AttributeError:
+            cache = self._local.cache = functools.lru_cache(maxsize=self._maxsize)(
+                self._func
+            )
+            with self._lock:
+                self._caches.add(cache)
+        return cache(host)
+
+    def cache_info(self) -> CacheInfo:
+        with self._lock:
+            infos = [cache.cache_info() for cache in self._caches]
+        return CacheInfo(
+            sum(info.hits for info in infos),
+            sum(info.misses for info in infos),
+            self._maxsize,
+            sum(info.currsize for info in infos),
+        )
+
+    def cache_clear(self) -> None:
+        with self._lock:
+            caches = list(self._caches)
+        for cache in caches:
+            cache.cache_clear()
+
+
+# (hosts, hosts including sub-domains) once load_all() has been called.
+_Eager = typing.Tuple[typing.FrozenSet[bytes], typing.FrozenSet[bytes]]
+
+
+class _LoadedList:
+    """One version of a list file with the caches of lookups in it. Lookups
+    read 'data' if the list is resident and open the file otherwise.
+    """
+
+    def __init__(
+        self,
+        path: typing.Optional[str],
+        data: typing.Optional[typing.Union[bytes, "mmap.mmap"]],
+        checksum: typing.Optional[str] = None,
+    ) -> None:
+        self.path = path
+        self.data = data
+        self.checksum = checksum
+        # Identifies the file the index was read from if it isn't resident,
+        # to tell whether it changed without reading the whole file.
+        self.file_id = None  # type: typing.Optional[typing.Tuple[int, ...]]
+        # Decoded from the header of the file on the first lookup.
+        self.index = None  # type: typing.Optional[_Index]
+        # gTLDs that are registered to preload all sub-domains, read from the
+        # file along with the index unless it's the bundled one.
+        self.gtld_include_subdomains = (
+            _GTLD_INCLUDE_SUBDOMAINS if path is None else frozenset()
+        )  # type: typing.AbstractSet[bytes]
+        self.eager = None  # type: typing.Optional[_Eager]
+        self.stats = None  # type: typing.Optional[_Stats]
+        # Whether every thread has its own host cache.
+        self.per_thread = False
+        self.bucket_cache = _BucketCache(maxsize=1024 * 1024)
+        self.set_host_cache(1024)
+        # Built by the first in_hsts_preload_packed() call.
+        self.packed_lookup = None  # type: typing.Optional[_PackedLookup]
+
+    def load_index(self) -> "_Index":
+        index = self.index
+        if index is None:
+            data = self.data
+            if data is not None:
+                index = _read_index(_buffer_reader(data))
+            else:
+                with _FileReader(self.path) as read:
+                    index = _read_index(read)
+                    self.file_id = read.file_id()
+            if index.gtld_include_subdomains is not None:
+                self.gtld_include_subdomains = index.gtld_include_subdomains
+            stats = self.stats
+            if stats is not None:
+                from hstspreload._extras import _StatsIndex
+
+                index = _StatsIndex(index, stats)
+            self.index = index
+        return index
+
+    def get_packed_lookup(self) -> typing.Optional["_PackedLookup"]:
+        """Returns the vectorized lookup of packed hosts in this list, None if
+        the list isn't in format version 2. Raises ImportError without NumPy.
+        """
+        packed_lookup = self.packed_lookup
+        if packed_lookup is None:
+            from hstspreload._extras import _PackedLookup, _unwrap_index
+
+            index = _unwrap_index(self.index or self.load_index())
+            if not isinstance(index, _SuffixHashIndex):
+                return None
+            # Optional and only needed here, importing it takes a while.
+            import numpy
+
+            data = self.data
+            if data is None:
+                data = _map_list(self.path)
+            packed_lookup = _PackedLookup(
+                numpy, index, data, self.gtld_include_subdomains
+            )
+            self.packed_lookup = packed_lookup
+        return packed_lookup
+
+    def set_host_cache(self, maxsize: int) -> None:
+        lookup = self.lookup if self.stats is None else self.lookup_with_stats
+        if self.per_thread:
+            self.host_cache = _PerThreadCache(lookup, maxsize)
+        else:
+            self.host_cache = functools.lru_cache(maxsize=maxsize)(lookup)
+        if self.stats is None:
+            self.cached_lookup = self.host_cache
+        else:
+            self.cached_lookup = self.cached_lookup_with_stats
+
+    def set_per_thread(self, per_thread: bool) -> None:
+        self.per_thread = per_thread
+        self.set_host_cache(self.host_cache.cache_info().maxsize)
+
+    def set_stats(self, stats: typing.Optional["_Stats"], reset: bool = True) -> None:
+        self.stats = stats
+        if stats is not None and reset:
+            stats.reset(self.bucket_cache)
+        if self.index is not None:
+            from hstspreload._extras import _StatsIndex, _unwrap_index
+
+            index = _unwrap_index(self.index)
+            self.index = index if stats is None else _StatsIndex(index, stats)
+        self.set_host_cache(self.host_cache.cache_info().maxsize)
+
+    def load_all(self) -> LoadInfo:
+        started = time.perf_counter()
+        data = self.data
+        if data is not None:
+            leaves = list(self.load_index().iter_leaves(_buffer_reader(data)))
+        else:
+            with _FileReader(self.path) as read:
+                leaves = list(self.load_index().iter_leaves(read))
+        hosts = frozenset(
+            name for name, flags in leaves if not flags & _INCLUDE_SUBDOMAINS
+        )
+        include_subdomains = frozenset(
+            name for name, flags in leaves if flags & _INCLUDE_SUBDOMAINS
+        )
+        self.eager = (hosts, include_subdomains)
+        seconds = time.perf_counter() - started
+
+        size = sys.getsizeof(hosts) + sys.getsizeof(include_subdomains)
+        size += sum(sys.getsizeof(name) for name, _ in leaves)
+        return LoadInfo(len(leaves), seconds, size)
+
+    def lookup(self, host: typing.AnyStr) -> bool:
+        if isinstance(host, str):
+            host = host.encode("ascii")
+        lowered = host.lower()
+        labels = lowered.split(b".")
+
+        # Fast-branch for gTLDs that are registered to preload all sub-domains.
+        if labels[-1] in self.gtld_include_subdomains:
+            return True
+
+        eager = self.eager
+        if eager is not None:
+            return _in_eager(host, eager)
+
+        data = self.data
+        if data is not None:
+            return self.walk(host, lowered, labels, _buffer_reader(data))
+
+        # Skip opening the file for hosts that can't be preloaded.
+        bloom = (self.index or self.load_index()).bloom
+        if bloom is not None and not bloom.may_match(host):
+            return False
+
+        with _FileReader(self.path) as read:
+            return self.walk(host, lowered, labels, read)
+
+    def walk(
+        self, host: bytes, lowered: bytes, labels: typing.List[bytes], read: "_Reader"
+    ) -> bool:
+        index = self.index or self.load_index()
+        if index.walks_labels:
+            return index.walk(host, lowered, labels[::-1], read)
+        keyed_by_suffix = index.keyed_by_suffix
+        decode = self.bucket_cache.maxsize > 0
+        # Start of the part of the host visited so far.
+        start = len(host) + 1
+        for layer, label in enumerate(labels[::-1]):
+            # None of our layers are greater than 5 deep.
+            if layer > 4:
+                return False
+
+            # Find the bucket for the layer and label
+            start -= len(label) + 1
+            key = lowered[start:] if keyed_by_suffix else label
+            bucket = index.locate(layer, key)
+            if bucket is None:
+                # No entry: host is not preloaded
+                return False
+
+            # Look up or scan the set of entries in that bucket
+            if decode:
+                entries = self.get_bucket(index, bucket, read)
+                found = _match_bucket(entries, key, host[start:], start == 0)
+            else:
+                data, offset = read(bucket[1], bucket[2])
+                found = index.scan(data, offset, bucket, key, host[start:], start == 0)
+            if found != _HAS_CHILDREN:
+                return found == _IS_LEAF
+        return False
+
+    def get_bucket(
+        self, index: "_Index", bucket: "_Bucket", read: "_Reader"
+    ) -> typing.Dict[bytes, int]:
+        entries = self.bucket_cache.get(bucket[0])
+        if entries is None:
+            data, offset = read(bucket[1], bucket[2])
+            entries = index.decode(data, offset, bucket)
+            self.bucket_cache.put(bucket[0], entries)
+        return entries
+
+    def lookup_many(self, hosts: typing.Iterable[typing.AnyStr]) -> typing.List[bool]:
+        hosts = [
+            host.encode("ascii") if isinstance(host, str) else host for host in hosts
+        ]
+        gtld_include_subdomains = self.gtld_include_subdomains
+        eager = self.eager
+        if eager is not None:
+            return [
+                host.lower().rpartition(b".")[2] in gtld_include_subdomains
+                or _in_eager(host, eager)
+                for host in hosts
+            ]
+
+        index = self.index or self.load_index()
+        if not index.keyed_by_suffix and not index.walks_labels:
+            # Labels share the buckets of format version 1, read each once.
+            return self.lookup_many_by_bucket(hosts)
+
+        data = self.data
+        if data is not None:
+            return self.walk_many(hosts, None, _buffer_reader(data))
+        with _FileReader(self.path) as read:
+            if index.walks_labels:
+                # Hosts share the nodes near the root, read each only once.
+                read = functools.lru_cache(maxsize=None)(read)
+            # Skip reading the file for hosts that can't be preloaded.
+            return self.walk_many(hosts, index.bloom, read)
+
+    def walk_many(
+        self,
+        hosts: typing.List[bytes],
+        bloom: typing.Optional["_BloomFilter"],
+        read: "_Reader",
+    ) -> typing.List[bool]:
+        gtld_include_subdomains = self.gtld_include_subdomains
+        walk = self.walk
+        results = []
+        for host in hosts:
+            lowered = host.lower()
+            labels = lowered.split(b".")
+            if labels[-1] in gtld_include_subdomains:
+                results.append(True)
+            elif bloom is not None and not bloom.may_match(host):
+                results.append(False)
+            else:
+                results.append(walk(host, lowered, labels, read))
+        return results
+
+    def lookup_many_by_bucket(self, hosts: typing.List[bytes]) -> typing.List[bool]:
+        gtld_include_subdomains = self.gtld_include_subdomains
+        results = [False] * len(hosts)
+
+        # Hosts still being resolved as (index, reversed labels, lowercase host,
+        # end of the labels not yet visited within the host).
+        pending = []
+        for index, host in enumerate(hosts):
+            lowered = host.lower()
+            labels = lowered.split(b".")
+            if labels[-1] in gtld_include_subdomains:
+                results[index] = True
+            else:
+                labels.reverse()
+                pending.append((index, labels, lowered, len(host)))
+
+        data = self.data
+        if data is not None:
+            self.resolve_many(hosts, pending, results, _buffer_reader(data))
+            return results
+
+        # Skip opening the file for hosts that can't be preloaded.
+        bloom = (self.index or self.load_index()).bloom
+        if bloom is not None:
+            pending = [item for item in pending if bloom.may_match(hosts[item[0]])]
+        if pending:
+            with _FileReader(self.path) as read:
+                self.resolve_many(hosts, pending, results, read)
+        return results
+
+    def resolve_many(
+        self,
+        hosts: typing.List[bytes],
+        pending: typing.List[typing.Tuple[int, typing.List[bytes], bytes, int]],
+        results: typing.List[bool],
+        read: "_Reader",
+    ) -> None:
+        index = self.index or self.load_index()
+        decode = self.bucket_cache.maxsize > 0
+        for layer in range(5):
+            # Group the hosts by the bucket their label is in for this layer.
+            located = {}  # type: typing.Dict[bytes, typing.Optional[_Bucket]]
+            groups = {}  # type: typing.Dict[typing.Hashable, typing.Any]
+            for item in pending:
+                _, labels, lowered, end = item
+                key = labels[layer]
+                start = end - len(key)
+                if key in located:
+                    bucket = located[key]
+                else:
+                    bucket = located[key] = index.locate(layer, key)
+                if bucket is not None:
+                    group = groups.setdefault(bucket[0], (bucket, []))
+                    group[1].append((item, key, start))
+
+            pending = []
+            for bucket, items in groups.values():
+                if decode:
+                    entries = self.get_bucket(index, bucket, read)
+                else:
+                    data, offset = read(bucket[1], bucket[2])
+                    entries = index.decode(data, offset, bucket)
+
+                for item, key, start in items:
+                    host_index, labels = item[0], item[1]
+                    suffix = hosts[host_index][start:]
+                    found = _match_bucket(entries, key, suffix, start == 0)
+                    if found == _IS_LEAF:
+                        results[host_index] = True
+                    elif found and len(labels) > layer + 1:
+                        pending.append(item[:3] + (start - 1,))
+
+            if not pending:
+                break
+
+    def cached_lookup_with_stats(self, host: typing.AnyStr) -> bool:
+        stats = self.stats
+        started = time.perf_counter()
+        result = self.host_cache(host)
+        if stats is not None:
+            stats.lookups += 1
+            if stats.histogram:
+                micros = int((time.perf_counter() - started) * 1e6)
+                stats.latency[min(micros.bit_length(), 31)] += 1
+        return result
+
+    def lookup_with_stats(self, host: typing.AnyStr) -> bool:
+        stats = self.stats
+        if stats is None:
+            return self.lookup(host)
+
+        stats.host_cache_misses += 1
+        stats.layer = -1
+        result = self.lookup(host)
+        if stats.layer >= 0:
+            stats.exit_layers[stats.layer] += 1
+        elif result:
+            if isinstance(host, str):
+                host = host.encode("ascii")
+            last_label = host.lower().rpartition(b".")[2]
+            if last_label in self.gtld_include_subdomains:
+                stats.gtld_hits += 1
+        return result
+
+
+def _read_index(read: "_Reader") -> "_Index":
+    data, offset = read(0, _HEADER.size)
+    try:
+        magic, version = _HEADER.unpack_from(data, offset)
+        if magic == _MAGIC and version == 3:
+            from hstspreload._extras import _TrieIndex
+
+            return _TrieIndex.load(read)
+        if magic == _MAGIC and version in _INDEX_TYPES:
+            return _INDEX_TYPES[version].load(read)
+    except (struct.error, IndexError, KeyError):
+        raise ValueError("truncated or corrupt hstspreload.bin file") from None
+    raise ValueError(
+        "unsupported hstspreload.bin format: %r version %d" % (magic, version)
+    )
+
+
+def _in_eager(host: bytes, eager: _Eager) -> bool:
+    hosts, include_subdomains = eager
+    if host in hosts:
+        return True
+    # None of our layers are greater than 5 deep.
+    dot = len(host)
+    for _ in range(5):
+        dot = host.rfind(b".", 0, dot)
+        if host[dot + 1 :] in include_subdomains:
+            return True
+        if dot < 0:
+            break
+    return False
+
+
+# Readers return the buffer holding a bucket and the offset it starts at.
+_Reader = typing.Callable[[int, int], typing.Tuple[typing.Any, int]]
+
+
+class _FileReader:
+    """Reads buckets from a list file, which is only opened when a lookup
+    needs a bucket that isn't in the bucket cache"""
+
+    def __init__(self, path: typing.Optional[str]) -> None:
+        self._path = path
+        self._file = None  # type: typing.Optional[typing.BinaryIO]
+
+    def __enter__(self) -> "_FileReader":
+        return self
+
+    def __exit__(self, *_: typing.Any) -> None:
+        if self._file is not None:
+            self._file.close()
+
+    def __call__(self, offset: int, size: int) -> typing.Tuple[bytearray, int]:
+        if self._file is None:
+            self._file = _open_list(self._path)
+        self._file.seek(offset)
+        data = bytearray(size)
+        self._file.readinto(data)
+        return data, 0
+
+    def file_id(self) -> typing.Optional[typing.Tuple[int, ...]]:
+        return None if self._file is None else _file_id(self._file)
+
+
+def _buffer_reader(data: typing.Any) -> _Reader:
+    def read(offset: int, size: int) -> typing.Tuple[typing.Any, int]:
+        return data, offset
+
+    return read
+
+
+def _match_bucket(
+    entries: typing.Dict[bytes, int], key: bytes, suffix: bytes, is_host: bool
+) -> int:
+    """Same as _Index.scan() for a decoded bucket"""
+    flags = entries.get(suffix, 0)
+    if flags & _IS_LEAF and (is_host or flags & _INCLUDE_SUBDOMAINS):
+        return _IS_LEAF
+    return entries.get(key, 0) & _HAS_CHILDREN
+
+
+# A bucket located by an index as (cache key, offset, size).
+_Bucket = typing.Tuple[typing.Hashable, int, int]
+
+
+class _Crc8Index:
+    """Format version 1: entries are bucketed by their layer and the crc8 of
+    their label in that layer. Leaves are stored under the whole host they
+    were preloaded for and the other entries under their label.
+    """
+
+    keyed_by_suffix = False
+    walks_labels = False
+    bloom = None
+
+    def __init__(
+        self,
+        jump_table: typing.List[typing.List[typing.Optional[_Bucket]]],
+        gtld_include_subdomains: typing.Optional[typing.FrozenSet[bytes]] = None,
+    ) -> None:
+        self.jump_table = jump_table
+        self.gtld_include_subdomains = gtld_include_subdomains
+
+    @classmethod
+    def load(cls, read: _Reader) -> "_Crc8Index":
+        data, offset = read(_HEADER.size, 5 * 256 * _JUMP_INFO.size)
+        values = struct.unpack_from("<%dI" % (5 * 256 * 2), data, offset)
+        jump_table = []  # type: typing.List[typing.List[typing.Optional[_Bucket]]]
+        for layer in range(5):
+            jump_table_for_layer = []  # type: typing.List[typing.Optional[_Bucket]]
+            for checksum in range(256):
+                i = (layer * 256 + checksum) * 2
+                if values[i + 1]:
+                    bucket = ((layer, checksum), values[i], values[i + 1])
+                    jump_table_for_layer.append(bucket)
+                else:
+                    jump_table_for_layer.append(None)
+            jump_table.append(jump_table_for_layer)
+
+        # The leaves of the first layer are the gTLDs.
+        gtld_include_subdomains = set()
+        for bucket in jump_table[0]:
+            if bucket is not None:
+                data, offset = read(bucket[1], bucket[2])
+                for flags, label in _iter_entries(data, offset, offset + bucket[2]):
+                    if flags & _IS_LEAF and flags & _INCLUDE_SUBDOMAINS:
+                        gtld_include_subdomains.add(label)
+        return cls(jump_table, frozenset(gtld_include_subdomains))
+
+    def locate(self, layer: int, label: bytes) -> typing.Optional[_Bucket]:
+        return self.jump_table[layer][_crc8(label)]
+
+    def scan(
+        self,
+        data: typing.Any,
+        pos: int,
+        bucket: _Bucket,
+        label: bytes,
+        suffix: bytes,
+        is_host: bool,
+    ) -> int:
+        return _scan_bucket(data, pos, pos + bucket[2], label, suffix, is_host)
+
+    def decode(
+        self, data: typing.Any, pos: int, bucket: _Bucket
+    ) -> typing.Dict[bytes, int]:
+        # Leaves are keyed by the host they were preloaded for and
+        # other entries by their label.
+        entries = {}  # type: typing.Dict[bytes, int]
+        for flags, label in _iter_entries(data, pos, pos + bucket[2]):
+            if flags & _IS_LEAF:
+                flags &= _IS_LEAF | _INCLUDE_SUBDOMAINS
+            else:
+                flags = _HAS_CHILDREN
+            entries[label] = entries.get(label, 0) | flags
+        return entries
+
+    def iter_leaves(self, read: _Reader) -> typing.Iterator[typing.Tuple[bytes, int]]:
+        """Yields the host and flags of every leaf in the list"""
+        for jump_table_for_layer in self.jump_table:
+            for bucket in jump_table_for_layer:
+                if bucket is not None:
+                    data, offset = read(bucket[1], bucket[2])
+                    for flags, label in _iter_entries(data, offset, offset + bucket[2]):
+                        if flags & _IS_LEAF:
+                            yield label, flags
+
+
+class _SuffixHashIndex:
+    """Format version 2: every suffix of a preloaded host that starts at a
+    label is one entry, flagged as a leaf and/or as having children. Entries
+    are bucketed by the crc32 of their suffix and sorted within a bucket, the
+    offset of every entry allows bisecting a bucket.
+
+    The header is followed by a table of sections: 'BKTS' holds the index of
+    the first entry of every bucket, 'OFFS' the offset of every entry and
+    'ENTS' the entries themselves, all little-endian uint32s. The optional
+    'BLOM' section holds a Bloom filter over every preloaded host and the
+    optional 'GTLD' section the gTLDs that preload all of their sub-domains,
+    encoded like entries.
+    """
+
+    keyed_by_suffix = True
+    walks_labels = False
+
+    def __init__(
+        self,
+        buckets: "array.array[int]",
+        offsets: "array.array[int]",
+        bloom: typing.Optional["_BloomFilter"] = None,
+        gtld_include_subdomains: typing.Optional[typing.FrozenSet[bytes]] = None,
+    ) -> None:
+        # Both arrays end with an extra item for the end of the last bucket.
+        self.buckets = buckets
+        self.offsets = offsets
+        self.mask = len(buckets) - 2
+        self.bloom = bloom
+        self.gtld_include_subdomains = gtld_include_subdomains
+
+    @classmethod
+    def load(cls, read: _Reader) -> "_SuffixHashIndex":
+        sections = _read_sections(read)
+        bloom = None
+        if b"BLOM" in sections:
+            bloom = _BloomFilter.load(read, *sections[b"BLOM"])
+        gtld_include_subdomains = None
+        if b"GTLD" in sections:
+            offset, size = sections[b"GTLD"]
+            data, pos = read(offset, size)
+            gtld_include_subdomains = frozenset(
+                label for _, label in _iter_entries(data, pos, pos + size)
+            )
+        return cls(
+            _read_uint32_array(read, *sections[b"BKTS"]),
+            _read_uint32_array(read, *sections[b"OFFS"]),
+            bloom,
+            gtld_include_subdomains,
+        )
+
+    def locate(self, layer: int, suffix: bytes) -> typing.Optional[_Bucket]:
+        bucket = zlib.crc32(suffix) & self.mask
+        first = self.buckets[bucket]
+        last = self.buckets[bucket + 1]
+        if first == last:
+            return None
+        offset = self.offsets[first]
+        return bucket, offset, self.offsets[last] - offset
+
+    def scan(
+        self,
+        data: typing.Any,
+        pos: int,
+        bucket: _Bucket,
+        key: bytes,
+        suffix: bytes,
+        is_host: bool,
+    ) -> int:
+        offsets = self.offsets
+        delta = pos - bucket[1]
+        lo = self.buckets[bucket[0]]
+        hi = self.buckets[bucket[0] + 1]
+        while lo < hi:
+            mid = (lo + hi) // 2
+            entry = offsets[mid] + delta
+            label = data[entry + 2 : entry + 2 + data[entry + 1]]
+            if label < key:
+                lo = mid + 1
+            elif label > key:
+                hi = mid
+            else:
+                flags = data[entry]
+                # Leaves only match hosts that are already lowercase.
+                if (
+                    flags & _IS_LEAF
+                    and (is_host or flags & _INCLUDE_SUBDOMAINS)
+                    and suffix == key
+                ):
+                    return _IS_LEAF
+                return flags & _HAS_CHILDREN
+        return 0
+
+    def decode(
+        self, data: typing.Any, pos: int, bucket: _Bucket
+    ) -> typing.Dict[bytes, int]:
+        return {
+            suffix: flags for flags, suffix in _iter_entries(data, pos, pos + bucket[2])
+        }
+
+    def iter_leaves(self, read: _Reader) -> typing.Iterator[typing.Tuple[bytes, int]]:
+        """Yields the host and flags of every leaf in the list"""
+        data, offset = read(self.offsets[0], self.offsets[-1] - self.offsets[0])
+        for flags, suffix in _iter_entries(
+            data, offset, offset + self.offsets[-1] - self.offsets[0]
+        ):
+            if flags & _IS_LEAF:
+                yield suffix, flags & (_IS_LEAF | _INCLUDE_SUBDOMAINS)
+
+
+class _BloomFilter:
+    """A Bloom filter over every preloaded host, stored as the number of hash
+    functions followed by the bits of the filter. Bit 'i' is bit 'i % 8' of
+    byte 'i // 8' and the bits of a key are picked by _bloom_hashes().
+    """
+
+    def __init__(self, hashes: int, bits: bytes) -> None:
+        self.hashes = hashes
+        self.bits = bits
+        self.size = len(bits) * 8
+
+    @classmethod
+    def load(cls, read: _Reader, offset: int, size: int) -> "_BloomFilter":
+        data, pos = read(offset, size)
+        return cls(data[pos], bytes(data[pos + 1 : pos + size]))
+
+    def may_match(self, host: bytes) -> bool:
+        """Returns False if no suffix of 'host' can be a preloaded host"""
+        bits = self.bits
+        size = self.size
+        hashes = range(self.hashes)
+        # None of our layers are greater than 5 deep.
+        dot = len(host)
+        for _ in range(5):
+            dot = host.rfind(b".", 0, dot)
+            h1, h2 = _bloom_hashes(host[dot + 1 :])
+            for _ in hashes:
+                bit = h1 % size
+                if not bits[bit >> 3] >> (bit & 7) & 1:
+                    break
+                h1 += h2
+            else:
+                return True
+            if dot < 0:
+                break
+        return False
+
+
+def _bloom_hashes(key: bytes) -> typing.Tuple[int, int]:
+    """Returns the first bit and the step between the bits of a key"""
+    h1 = zlib.crc32(key)
+    return h1, (h1 >> 11 | h1 << 21) & 0xFFFFFFFF | 1
+
+
+_Index = typing.Union[_Crc8Index, _SuffixHashIndex, "_TrieIndex"]
+# Format version 3 is in _extras with the other rarely used parts.
+_INDEX_TYPES = {
+    1: _Crc8Index,
+    2: _SuffixHashIndex,
+}  # type: typing.Dict[int, typing.Any]
+
+
+def _read_sections(read: _Reader) -> typing.Dict[bytes, typing.Tuple[int, int]]:
+    data, offset = read(_HEADER.size, _SECTION_COUNT.size)
+    (count,) = _SECTION_COUNT.unpack_from(data, offset)
+    data, offset = read(_HEADER.size + _SECTION_COUNT.size, count * _SECTION.size)
+    sections = {}
+    for i in range(count):
+        tag, section_offset, size = _SECTION.unpack_from(
+            data, offset + i * _SECTION.size
+        )
+        sections[tag] = (section_offset, size)
+    return sections
+
+
+def _read_uint32_array(read: _Reader, offset: int, size: int) -> "array.array[int]":
+    data, pos = read(offset, size)
+    values = array.array(_UINT32)
+    values.frombytes(data[pos : pos + size])
+    if sys.byteorder == "big":
+        values.byteswap()
+    return values
+
+
+def _scan_bucket(
+    data: typing.Any, pos: int, end: int, label: bytes, suffix: bytes, is_host: bool
+) -> int:
+    """Scans the entries in data[pos:end] without copying them.
+
+    Leaves are stored under the whole host they were preloaded for, so the
+    only leaf that can match in this layer is 'suffix'. Returns _IS_LEAF if
+    the host is preloaded, _HAS_CHILDREN if 'label' continues into the next
+    layer and 0 otherwise.
+    """
+    label_size = len(label)
+    suffix_size = len(suffix)
+    find = data.find
+    while pos < end:
+        flags = data[pos]
+        size = data[pos + 1]
+        pos += 2
+        if flags & _IS_LEAF:
+            # We found a potential leaf
+            if (
+                size == suffix_size
+                and (is_host or flags & _INCLUDE_SUBDOMAINS)
+                and find(suffix, pos, pos + size) == pos
+            ):
+                return _IS_LEAF
+
+        # Continue traversing as we're not at a leaf.
+        elif size == label_size and find(label, pos, pos + size) == pos:
+            return _HAS_CHILDREN
+        pos += size
+    return 0
+
+
+def _iter_entries(
+    data: typing.Any, pos: int, end: int
+) -> typing.Iterator[typing.Tuple[int, bytes]]:
+    view = memoryview(data)
+    while pos < end:
+        flags = view[pos]
+        size = view[pos + 1]
+        pos += 2 + size
+        yield flags, bytes(view[pos - size : pos])
+
+
+def _crc8(value: bytes) -> int:
+    # CRC8 reference implementation: https://github.com/niccokunzmann/crc8
+    checksum = 0x00
+    for byte in value:
+        checksum = _CRC8_TABLE[checksum ^ byte]
+    return checksum
+
+
+# The bundled list used by the functions of hstspreload.
+hstspreload._set_default(HSTSPreloadList())
@@ -6,6 +6,7 @@ source_files = (
     "hstspreload/",
     "test_hstspreload.py",
     "build-hstspreload.py",
+    "bench-hstspreload.py",
     "setup.py",
     "noxfile.py",
 )
@@ -49,6 +50,24 @@ def test(session):
     session.run("python", "-m", "pytest", "-q", "test_hstspreload.py")
 
 
+@nox.session(reuse_venv=True)
+def test_numpy(session):
+    # Runs the vectorized lookups of in_hsts_preload_packed() too.
+    session.install("-rrequirements/test.txt")
+    session.install("numpy")
+    session.install(".")
+
+    session.run("python", "-m", "pytest", "-q", "test_hstspreload.py")
+
+
+@nox.session(reuse_venv=True)
+def bench(session):
+    session.install("-rrequirements/test.txt")
+    session.install(".")
+
+    session.run("python", "bench-hstspreload.py", *session.posargs)
+
+
 @nox.session(reuse_venv=True)
 def deploy(session):
     session.install("-rrequirements/deploy.txt")